@@ -1,8 +1,18 @@
 """
 Demo Datasets for AgentGuard
 Multiple realistic agent system scenarios for demonstration
+- Hand-written ecommerce and content pipeline fixtures
+- Seeded synthetic topologies of 1k-1M agents for load testing ("synthetic-<n>[-<seed>]"),
+  capped by SYNTHETIC_MAX_AGENTS
 """
 
+import os
+import random
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Any, Tuple
+
+from graph_engine import AgentGraph, GraphBuilder
+
 def get_ecommerce_dataset():
     """E-commerce platform with 24 agents"""
     agents = [
@@ -590,6 +600,221 @@ def get_ai_content_pipeline_dataset():
     return {"agents": agents, "dependencies": dependencies}
 
 
+# Synthetic topologies: agent count bounds and the default size and seed.
+# A scanned and drawn topology holds about 0.8 GB per 100k agents (records,
+# indexes, graph view and encoded responses), so the default cap suits a
+# few-GB host; raise SYNTHETIC_MAX_AGENTS (up to 1M) on a larger one.
+SYNTHETIC_MIN_AGENTS = 1_000
+SYNTHETIC_MAX_AGENTS = min(int(os.getenv("SYNTHETIC_MAX_AGENTS", "250000")), 1_000_000)
+SYNTHETIC_DEFAULT_AGENTS = 10_000
+SYNTHETIC_DEFAULT_SEED = 42
+
+# Layers from the edge of the system inward, with their share of agents.
+# Calls flow down the list; shadow agents sit beside it as fallbacks.
+SYNTHETIC_LAYERS = [
+    ("user_facing", 0.05),
+    ("core_service", 0.55),
+    ("ml_service", 0.15),
+    ("data_service", 0.22),
+    ("shadow_agent", 0.03),
+]
+
+SYNTHETIC_DOMAINS = [
+    "payments", "orders", "catalog", "search", "pricing", "inventory", "shipping",
+    "identity", "billing", "notifications", "analytics", "recommendations", "fraud",
+    "support", "content", "media", "reviews", "loyalty", "tax", "returns",
+]
+SYNTHETIC_ROLES = {
+    "user_facing": ["gateway", "web", "mobile-bff", "chat-assistant", "portal"],
+    "core_service": ["api", "orchestrator", "planner", "router", "worker", "agent"],
+    "ml_service": ["ranker", "classifier", "embedder", "llm-agent", "scorer"],
+    "data_service": ["store", "cache", "index", "feature-store", "ledger"],
+    "shadow_agent": ["legacy", "cron-bot", "sync-script", "v1-fallback", "manual-bot"],
+}
+
+# Target choice within a layer is skewed toward its first agents (r ** skew),
+# giving a few high fan-in hubs and a long tail of rarely called agents
+SYNTHETIC_HUB_SKEW = 3.0
+
+# Calls per agent of the calling layers: one plus an exponential draw with this mean, capped
+SYNTHETIC_FAN_OUT = {"user_facing": 4.0, "core_service": 2.5, "ml_service": 1.5}
+SYNTHETIC_MAX_FAN_OUT = 40
+
+# Per-agent chances of the less common edge kinds
+SYNTHETIC_CYCLE_RATE = 0.01       # a core service's callee calls back into it
+SYNTHETIC_FALLBACK_RATE = 0.05    # core service falls back to a shadow agent
+SYNTHETIC_SYNC_RATE = 0.10        # data service replicates to another data service
+
+SYNTHETIC_CONFIDENCE = {
+    "api_call": (0.85, 0.99),
+    "event": (0.80, 0.97),
+    "sync": (0.70, 0.90),
+    "fallback": (0.65, 0.88),
+}
+
+
+def _synthetic_layout(agent_count: int) -> Tuple[List[int], List[str]]:
+    """Start index of each layer (plus the end) and the layer types"""
+    starts = [0]
+    for _, share in SYNTHETIC_LAYERS[:-1]:
+        starts.append(starts[-1] + max(1, round(agent_count * share)))
+    starts.append(agent_count)
+    return starts, [layer for layer, _ in SYNTHETIC_LAYERS]
+
+
+def _synthetic_id(index: int, agent_type: str) -> str:
+    """Agent id derived from its index alone, so edges never need the agent list"""
+    domain = SYNTHETIC_DOMAINS[index % len(SYNTHETIC_DOMAINS)]
+    roles = SYNTHETIC_ROLES[agent_type]
+    return f"{domain}-{roles[(index // len(SYNTHETIC_DOMAINS)) % len(roles)]}-{index}"
+
+
+def synthetic_agents(agent_count: int, seed: int = SYNTHETIC_DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    """Agent records of a synthetic topology, generated one at a time"""
+    rng = random.Random(seed)
+    starts, types = _synthetic_layout(agent_count)
+    for layer, agent_type in enumerate(types):
+        start, end = starts[layer], starts[layer + 1]
+        for index in range(start, end):
+            # Hubs (the first agents of a layer) are busier and riskier
+            rank = (index - start) / max(end - start, 1)
+            if agent_type == "shadow_agent":
+                risk = rng.choice(["critical", "high", "high", "medium"])
+            else:
+                risk = "critical" if rank < 0.02 else "high" if rank < 0.10 else "medium" if rank < 0.40 else "low"
+            agent_id = _synthetic_id(index, agent_type)
+            domain = SYNTHETIC_DOMAINS[index % len(SYNTHETIC_DOMAINS)]
+            shadow = agent_type == "shadow_agent"
+            yield {
+                "id": agent_id,
+                "name": "".join(part.capitalize() for part in agent_id.split("-")),
+                "type": agent_type,
+                "risk": risk,
+                "version": f"{rng.randint(0 if shadow else 1, 4)}.{rng.randint(0, 9)}.{rng.randint(0, 20)}",
+                "uptime": f"{rng.uniform(88.0, 96.0) if shadow else rng.uniform(97.0, 99.99):.1f}%",
+                "requests_per_min": int(rng.lognormvariate(5.0, 1.2) * (1 + 20 * (1 - rank) ** 8)),
+                "avg_latency_ms": int(rng.lognormvariate(7.0 if shadow else 5.0, 0.6)),
+                "last_deployed": f"{2023 if shadow else 2025}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+                "owner": "unknown" if shadow else f"{domain}-team@company.com"
+            }
+
+
+def synthetic_dependencies(agent_count: int, seed: int = SYNTHETIC_DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    """
+    Dependency records of a synthetic topology, generated one source agent
+    at a time (callbacks are emitted alongside the call they answer).
+    Mostly layered calls toward hub agents, plus events, data replication,
+    fallbacks to shadow agents and a few cycles among core services.
+    """
+    rng = random.Random(seed + 1)
+    starts, types = _synthetic_layout(agent_count)
+    bounds = {agent_type: (starts[i], starts[i + 1]) for i, agent_type in enumerate(types)}
+    core_start, core_end = bounds["core_service"]
+
+    def pick(lo: int, hi: int) -> int:
+        return lo + int((hi - lo) * rng.random() ** SYNTHETIC_HUB_SKEW)
+
+    def edge(source: int, target: int, dep_type: str) -> Dict[str, Any]:
+        low, high = SYNTHETIC_CONFIDENCE[dep_type]
+        return {
+            "source": _synthetic_id(source, types[bisect_right(starts, source) - 1]),
+            "target": _synthetic_id(target, types[bisect_right(starts, target) - 1]),
+            "type": dep_type,
+            "confidence": round(rng.uniform(low, high), 2)
+        }
+
+    for source in range(agent_count):
+        agent_type = types[bisect_right(starts, source) - 1]
+        targets = {}
+        if agent_type in SYNTHETIC_FAN_OUT:
+            fan_out = min(1 + int(rng.expovariate(1 / SYNTHETIC_FAN_OUT[agent_type])), SYNTHETIC_MAX_FAN_OUT)
+            for _ in range(fan_out):
+                roll = rng.random()
+                if agent_type == "user_facing":
+                    target, dep_type = pick(*bounds["core_service"]), "api_call"
+                elif agent_type == "core_service" and roll < 0.6 and source + 1 < core_end:
+                    # Deeper core services only, which keeps these calls acyclic
+                    target = pick(source + 1, core_end)
+                    dep_type = "event" if rng.random() < 0.2 else "api_call"
+                elif agent_type == "core_service" and roll < 0.75:
+                    target, dep_type = pick(*bounds["ml_service"]), "api_call"
+                else:
+                    target, dep_type = pick(*bounds["data_service"]), "api_call"
+                targets.setdefault(target, dep_type)
+
+        if agent_type == "core_service":
+            callees = [t for t in targets if source < t < core_end]
+            if callees and rng.random() < SYNTHETIC_CYCLE_RATE:
+                # Usually the nearest callee calls back (a short cycle); now
+                # and then a farther one, whose cycle spans everything between
+                callee = min(callees) if rng.random() < 0.8 else rng.choice(callees)
+                yield edge(callee, source, "event")
+            if rng.random() < SYNTHETIC_FALLBACK_RATE:
+                targets.setdefault(rng.randrange(*bounds["shadow_agent"]), "fallback")
+        elif agent_type == "data_service":
+            _, data_end = bounds["data_service"]
+            if source + 1 < data_end and rng.random() < SYNTHETIC_SYNC_RATE:
+                targets.setdefault(rng.randrange(source + 1, data_end), "sync")
+        elif agent_type == "shadow_agent" and rng.random() < 0.5:
+            # Legacy jobs still writing straight to a data store
+            targets.setdefault(pick(*bounds["data_service"]), "sync")
+
+        for target, dep_type in targets.items():
+            yield edge(source, target, dep_type)
+
+
+def get_synthetic_dataset(agent_count: int = SYNTHETIC_DEFAULT_AGENTS, seed: int = SYNTHETIC_DEFAULT_SEED):
+    """Seeded synthetic topology of 1k-1M agents; the same arguments give the same dataset"""
+    agent_count = min(max(agent_count, SYNTHETIC_MIN_AGENTS), SYNTHETIC_MAX_AGENTS)
+    agents = list(synthetic_agents(agent_count, seed))
+    # Point edges at the agents' own id strings rather than one copy per edge
+    ids = {agent["id"]: agent["id"] for agent in agents}
+    dependencies = []
+    for dep in synthetic_dependencies(agent_count, seed):
+        dep["source"] = ids[dep["source"]]
+        dep["target"] = ids[dep["target"]]
+        dependencies.append(dep)
+    return {"agents": agents, "dependencies": dependencies}
+
+
+def synthetic_graph(demo_type: str) -> AgentGraph:
+    """
+    AgentGraph of a "synthetic-<n>[-<seed>]" topology, fed record by record
+    from the generators into a GraphBuilder, never collected as a dataset
+    """
+    agent_count, seed = _synthetic_params(demo_type)
+    agent_count = min(max(agent_count, SYNTHETIC_MIN_AGENTS), SYNTHETIC_MAX_AGENTS)
+    builder = GraphBuilder()
+    for agent in synthetic_agents(agent_count, seed):
+        builder.add_agent(agent)
+    for dep in synthetic_dependencies(agent_count, seed):
+        builder.add_dependency(dep)
+    return AgentGraph.from_builder(builder)
+
+
+def _synthetic_params(demo_type: str) -> Tuple[int, int]:
+    """
+    ("synthetic-<n>[-<seed>]") -> (agent count, seed); n accepts a k/m
+    suffix. Raises ValueError for anything else.
+    """
+    prefix, *parts = demo_type.split("-")
+    agent_count, seed = SYNTHETIC_DEFAULT_AGENTS, SYNTHETIC_DEFAULT_SEED
+    try:
+        if prefix != "synthetic" or len(parts) > 2:
+            raise ValueError
+        if parts:
+            size = parts[0].lower()
+            multiplier = {"k": 1_000, "m": 1_000_000}.get(size[-1:], 1)
+            agent_count = int(size[:-1] if multiplier > 1 else size) * multiplier
+        if len(parts) > 1:
+            seed = int(parts[1])
+    except ValueError:
+        raise ValueError(
+            f"Invalid demo_type {demo_type!r}: expected synthetic-<n>[-<seed>], e.g. synthetic-100k"
+        ) from None
+    return agent_count, seed
+
+
 def get_dataset(demo_type: str):
     """Get dataset by type"""
     datasets = {
@@ -597,5 +822,8 @@ def get_dataset(demo_type: str):
         "content": get_ai_content_pipeline_dataset,
     }
     
+    if demo_type and demo_type.startswith("synthetic"):
+        return get_synthetic_dataset(*_synthetic_params(demo_type))
+    
     dataset_func = datasets.get(demo_type, get_ecommerce_dataset)
     return dataset_func()
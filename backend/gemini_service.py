@@ -9,47 +9,573 @@ Handles all interactions with Google's Gemini 3 API for:
 
 import os
 import json
-from typing import Dict, List, Any, Optional
-import google.generativeai as genai
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure Gemini API
+# The Gemini SDK (google.generativeai) takes most of a second to import, so
+# it is loaded on first use or by the startup warm-up, not at import time
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
 # Use Gemini 3 Flash for fast responses
 MODEL_NAME = "gemini-3-flash-preview"
 
+# Maximum Gemini requests in flight at once across all endpoints
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+# Resilience: per-call deadline, optional hedged second request once a call
+# outlives the given latency percentile, and a circuit breaker that sends
+# callers straight to the mock fallbacks after repeated failures. Waiting
+# for a concurrency slot has its own deadline and never counts as a failure.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20"))
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "20"))
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+GEMINI_HEDGE_MIN_SAMPLES = 20
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+
+# Set for calls made by background work (playbook pre-generation); these
+# only take a concurrency slot while no interactive call is queued or in
+# flight
+_background_call: ContextVar[bool] = ContextVar("gemini_background_call", default=False)
+
+
+class GeminiUnavailableError(Exception):
+    """
+    Raised instead of calling Gemini: not configured, circuit breaker open,
+    or no concurrency slot free within GEMINI_QUEUE_TIMEOUT_SECONDS
+    """
+
+
+class _CircuitBreaker:
+    """
+    closed: calls flow. After `failure_threshold` consecutive failures it
+    opens and rejects calls for `reset_seconds`, then goes half-open and
+    lets a single probe through; the probe's outcome closes or reopens it.
+    """
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+    
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+    
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+    
+    def release(self) -> None:
+        """Forget a call that was cancelled before it succeeded or failed"""
+        self.probe_in_flight = False
+    
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected_calls": self.rejected,
+            "retry_in_seconds": round(retry_in, 1)
+        }
+
+# Response cache: in-memory LRU in front of an on-disk SQLite tier. An empty
+# GEMINI_CACHE_PATH keeps the cache in memory only.
+GEMINI_CACHE_PATH = os.getenv("GEMINI_CACHE_PATH", "gemini_cache.sqlite3")
+GEMINI_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "86400"))
+GEMINI_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "512"))
+# Expired disk rows are deleted once per this many writes, not on every put
+GEMINI_CACHE_EVICT_EVERY = 256
+# Keys per SELECT when looking up many responses at once
+GEMINI_CACHE_LOOKUP_CHUNK = 500
+
+# Bulk risk explanations: agents per prompt and batches in flight
+RISK_EXPLAIN_BATCH_SIZE = 20
+RISK_EXPLAIN_MAX_CONCURRENCY = 3
+
+# Bulk evidence reasoning: edges per prompt, batches in flight and the
+# request rate the pipeline may use
+EVIDENCE_BATCH_SIZE = 25
+EVIDENCE_MAX_CONCURRENCY = 3
+EVIDENCE_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_EVIDENCE_RPM", "60"))
+
+
+class _RateLimiter:
+    """Spaces acquisitions evenly so at most per_minute happen each minute"""
+    
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ResponseCache:
+    """
+    Gemini responses keyed by a hash of model name and rendered prompt.
+    Memory tier is an LRU with TTL; the SQLite tier survives restarts and
+    refills the memory tier on a hit. Disk reads and writes run in a worker
+    thread so the event loop never waits on SQLite.
+    """
+    
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._db = None
+        self._lock = threading.Lock()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+                # WAL lets several worker processes share the cache file
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, model TEXT, value TEXT, created_at REAL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Gemini disk cache disabled: {e}")
+                self._db = None
+    
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode()).hexdigest()
+    
+    async def get(self, key: str) -> Optional[str]:
+        return (await self.get_many([key])).get(key)
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Cached values for whichever keys have one; one disk query per chunk"""
+        now = time.time()
+        found: Dict[str, str] = {}
+        missing = []
+        for key in keys:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[key] = value
+                    continue
+                del self._memory[key]
+            missing.append(key)
+        
+        if missing and self._db is not None:
+            rows = await asyncio.to_thread(self._load, missing)
+            for key, (value, created_at) in rows.items():
+                if now - created_at < self.ttl_seconds:
+                    self._remember(key, created_at, value)
+                    self.disk_hits += 1
+                    found[key] = value
+        
+        self.misses += len(keys) - len(found)
+        return found
+    
+    async def put(self, key: str, model_name: str, value: str) -> None:
+        await self.put_many(model_name, {key: value})
+    
+    async def put_many(self, model_name: str, values: Dict[str, str]) -> None:
+        created_at = time.time()
+        for key, value in values.items():
+            self._remember(key, created_at, value)
+        if self._db is not None and values:
+            await asyncio.to_thread(self._store, model_name, values, created_at)
+    
+    def _load(self, keys: List[str]) -> Dict[str, Tuple[str, float]]:
+        rows: Dict[str, Tuple[str, float]] = {}
+        try:
+            with self._lock:
+                for i in range(0, len(keys), GEMINI_CACHE_LOOKUP_CHUNK):
+                    chunk = keys[i:i + GEMINI_CACHE_LOOKUP_CHUNK]
+                    for key, value, created_at in self._db.execute(
+                        f"SELECT key, value, created_at FROM responses WHERE key IN ({', '.join('?' for _ in chunk)})",
+                        chunk
+                    ):
+                        rows[key] = (value, created_at)
+        except sqlite3.Error as e:
+            print(f"Gemini disk cache error: {e}")
+        return rows
+    
+    def _store(self, model_name: str, values: Dict[str, str], created_at: float) -> None:
+        try:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO responses (key, model, value, created_at) VALUES (?, ?, ?, ?)",
+                    [(key, model_name, value, created_at) for key, value in values.items()]
+                )
+                self._writes_since_evict += len(values)
+                if self._writes_since_evict >= GEMINI_CACHE_EVICT_EVERY:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE created_at < ?", (created_at - self.ttl_seconds,)
+                    )
+                    self._writes_since_evict = 0
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Gemini disk cache error: {e}")
+    
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "disk_enabled": self._db is not None
+        }
+
+
+class _StepStreamParser:
+    """
+    Pulls each complete object out of the top-level "steps" array of a JSON
+    document while its text is still streaming in
+    """
+    
+    def __init__(self):
+        self.buffer = ""
+        self.pos = -1
+        self.depth = 0
+        self.start = 0
+        self.in_string = False
+        self.escaped = False
+        self.done = False
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.buffer += text
+        if self.pos == -1:
+            key = self.buffer.find('"steps"')
+            bracket = self.buffer.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return []
+            self.pos = bracket + 1
+        
+        steps = []
+        buffer = self.buffer
+        while not self.done and self.pos < len(buffer):
+            ch = buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        steps.append(json.loads(buffer[self.start:self.pos + 1]))
+                    except ValueError:
+                        pass
+            elif ch == "]" and self.depth == 0:
+                self.done = True
+            self.pos += 1
+        return steps
+
 
 class GeminiService:
     """Service class for Gemini 3 API interactions"""
     
     def __init__(self):
-        self.model = None
-        if GEMINI_API_KEY:
-            try:
-                self.model = genai.GenerativeModel(MODEL_NAME)
-            except Exception as e:
-                print(f"Warning: Could not initialize Gemini model: {e}")
+        self._model: Any = None
+        self._model_loaded = False
+        self._semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        self.breaker = _CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS)
+        self._latencies: deque = deque(maxlen=200)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._interactive_calls = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+        self.cache = ResponseCache(GEMINI_CACHE_PATH, GEMINI_CACHE_TTL_SECONDS, GEMINI_CACHE_MAX_ENTRIES)
+        self.load_ms: Optional[float] = None
+        self._load_lock = threading.Lock()
+    
+    @property
+    def model(self) -> Any:
+        """The GenerativeModel, importing and configuring the SDK on first access"""
+        if not self._model_loaded:
+            self.load_model()
+        return self._model
+    
+    @model.setter
+    def model(self, value: Any) -> None:
+        self._model = value
+        self._model_loaded = value is not None
+    
+    def load_model(self) -> None:
+        """Import the SDK and build the model once; safe to call from a worker thread"""
+        with self._load_lock:
+            if self._model_loaded:
+                return
+            started = time.perf_counter()
+            if GEMINI_API_KEY:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    self._model = genai.GenerativeModel(MODEL_NAME)
+                except Exception as e:
+                    print(f"Warning: Could not initialize Gemini model: {e}")
+            self.load_ms = (time.perf_counter() - started) * 1000
+            self._model_loaded = True
+    
+    async def _ensure_model(self) -> Any:
+        """Model for an async caller, loading the SDK off the event loop if needed"""
+        if not self._model_loaded:
+            await asyncio.to_thread(self.load_model)
+        return self._model
     
     def is_available(self) -> bool:
-        """Check if Gemini API is available"""
-        return self.model is not None
+        """Check if Gemini API is available (without forcing the SDK to load)"""
+        if not self._model_loaded:
+            return bool(GEMINI_API_KEY)
+        return self._model is not None
+    
+    @contextmanager
+    def background(self):
+        """Mark Gemini calls made in this context as low priority"""
+        token = _background_call.set(True)
+        try:
+            yield
+        finally:
+            _background_call.reset(token)
+    
+    def _interactive_started(self) -> None:
+        self._interactive_calls += 1
+        self._interactive_idle.clear()
+    
+    def _interactive_done(self) -> None:
+        self._interactive_calls -= 1
+        if self._interactive_calls == 0:
+            self._interactive_idle.set()
+    
+    async def _interactive_slot(self) -> None:
+        """
+        Acquire a concurrency slot for an interactive call, queueing at most
+        GEMINI_QUEUE_TIMEOUT_SECONDS. A full queue is not a Gemini failure,
+        so it is kept away from the circuit breaker.
+        """
+        try:
+            async with asyncio.timeout(GEMINI_QUEUE_TIMEOUT_SECONDS):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            raise GeminiUnavailableError(
+                f"No Gemini slot free within {GEMINI_QUEUE_TIMEOUT_SECONDS}s"
+            ) from None
+    
+    async def _background_slot(self) -> None:
+        """
+        Acquire a concurrency slot for a background call, handing it back
+        whenever an interactive call is queued or in flight
+        """
+        while True:
+            await self._interactive_idle.wait()
+            await self._semaphore.acquire()
+            if self._interactive_idle.is_set():
+                return
+            self._semaphore.release()
+    
+    async def _generate(self, prompt: str, as_json: bool = False) -> Any:
+        """
+        Run one prompt through the SDK's async API, so the event loop keeps
+        serving other requests while Gemini responds. The model (and its
+        async client) is reused; the semaphore caps requests in flight.
+        Responses are cached by model and prompt; with as_json, the text is
+        parsed and only cached once it parses.
+        """
+        key = self.cache.key(MODEL_NAME, prompt)
+        text = await self.cache.get(key)
+        if text is None:
+            text = await self._call_model(prompt)
+            result = json.loads(text) if as_json else text
+            await self.cache.put(key, MODEL_NAME, text)
+            return result
+        return json.loads(text) if as_json else text
+    
+    async def _call_model(self, prompt: str) -> str:
+        """
+        One Gemini round-trip behind the circuit breaker, bounded by
+        GEMINI_TIMEOUT_SECONDS once it holds a concurrency slot
+        """
+        interactive = not _background_call.get()
+        slot_held = False
+        try:
+            if interactive:
+                self._interactive_started()
+                await self._interactive_slot()
+            else:
+                await self._background_slot()
+            slot_held = True
+            model = await self._ensure_model()
+            if model is None:
+                raise GeminiUnavailableError("Gemini model could not be initialized")
+            if not self.breaker.allow():
+                raise GeminiUnavailableError("Gemini circuit breaker is open")
+            loop = asyncio.get_running_loop()
+            try:
+                async with asyncio.timeout(GEMINI_TIMEOUT_SECONDS):
+                    started = loop.time()
+                    response = await self._hedged_call(prompt)
+                    text = response.text.strip()
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except TimeoutError:
+                self.breaker.record_failure()
+                raise TimeoutError(f"Gemini call timed out after {GEMINI_TIMEOUT_SECONDS}s")
+            except Exception:
+                self.breaker.record_failure()
+                raise
+        finally:
+            if slot_held:
+                self._semaphore.release()
+            if interactive:
+                self._interactive_done()
+        self.breaker.record_success()
+        self._latencies.append(loop.time() - started)
+        return text
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Observed latency percentile after which a hedge is sent, if enabled"""
+        if not GEMINI_HEDGE_ENABLED or len(self._latencies) < GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(GEMINI_HEDGE_PERCENTILE / 100 * (len(ordered) - 1))]
+    
+    async def _hedged_call(self, prompt: str) -> Any:
+        """
+        Send the prompt; if it is still running after the hedge delay, send
+        it again and keep whichever succeeds first
+        """
+        delay = self._hedge_delay()
+        first = asyncio.ensure_future(self.model.generate_content_async(prompt))
+        pending = {first}
+        try:
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if first.done():
+                    return first.result()
+                self.hedges_sent += 1
+                pending.add(asyncio.ensure_future(self.model.generate_content_async(prompt)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Circuit breaker state, latency percentiles and hedging counters"""
+        ordered = sorted(self._latencies)
+        
+        def percentile(q: float) -> Optional[float]:
+            return round(ordered[int(q / 100 * (len(ordered) - 1))] * 1000, 1) if ordered else None
+        
+        return {
+            "available": self.is_available(),
+            "sdk_loaded": self._model_loaded,
+            "sdk_load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "circuit_breaker": self.breaker.snapshot(),
+            "timeout_seconds": GEMINI_TIMEOUT_SECONDS,
+            "queue_timeout_seconds": GEMINI_QUEUE_TIMEOUT_SECONDS,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "samples": len(ordered)},
+            "hedging": {
+                "enabled": GEMINI_HEDGE_ENABLED,
+                "delay_ms": round(self._hedge_delay() * 1000, 1) if self._hedge_delay() is not None else None,
+                "sent": self.hedges_sent,
+                "won": self.hedges_won
+            }
+        }
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the Gemini response cache"""
+        return self.cache.stats()
     
     async def analyze_incident(
         self,
         failed_agent: Dict[str, Any],
         impacted_agents: List[Dict[str, Any]],
-        dependencies: List[Dict[str, Any]]
+        dependencies: List[Dict[str, Any]],
+        fallback: bool = True
     ) -> Dict[str, Any]:
         """
         Analyze an incident using Gemini 3
-        Returns root cause analysis and severity assessment
+        Returns root cause analysis and severity assessment; with
+        fallback=False, errors are raised instead of answered with the mock
         """
         if not self.is_available():
+            if not fallback:
+                raise GeminiUnavailableError("Gemini API is not configured")
             return self._mock_incident_analysis(failed_agent, impacted_agents)
         
         prompt = f"""You are an expert in distributed systems and AI agent reliability.
@@ -81,10 +607,11 @@ Provide a structured analysis in JSON format:
 Respond with ONLY valid JSON, no markdown or explanation."""
 
         try:
-            response = self.model.generate_content(prompt)
-            result = json.loads(response.text.strip())
+            result = await self._generate(prompt, as_json=True)
             return result
         except Exception as e:
+            if not fallback:
+                raise
             print(f"Gemini API error: {e}")
             return self._mock_incident_analysis(failed_agent, impacted_agents)
     
@@ -93,16 +620,121 @@ Respond with ONLY valid JSON, no markdown or explanation."""
         failed_agent: Dict[str, Any],
         impacted_agents: List[Dict[str, Any]],
         dependencies: List[Dict[str, Any]],
-        incident_analysis: Dict[str, Any]
+        incident_analysis: Dict[str, Any],
+        fallback: bool = True
     ) -> Dict[str, Any]:
         """
         Generate a recovery playbook using Gemini 3
-        Returns step-by-step recovery plan with verification steps
+        Returns step-by-step recovery plan with verification steps; with
+        fallback=False, errors are raised instead of answered with the mock
         """
         if not self.is_available():
+            if not fallback:
+                raise GeminiUnavailableError("Gemini API is not configured")
             return self._mock_playbook(failed_agent, impacted_agents)
         
-        prompt = f"""You are an expert SRE (Site Reliability Engineer) creating incident response playbooks.
+        prompt = self._playbook_prompt(failed_agent, impacted_agents, incident_analysis)
+
+        try:
+            result = await self._generate(prompt, as_json=True)
+            return result
+        except Exception as e:
+            if not fallback:
+                raise
+            print(f"Gemini API error: {e}")
+            return self._mock_playbook(failed_agent, impacted_agents)
+    
+    async def stream_playbook(
+        self,
+        failed_agent: Dict[str, Any],
+        impacted_agents: List[Dict[str, Any]],
+        dependencies: List[Dict[str, Any]],
+        incident_analysis: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of generate_playbook.
+        Yields ("step", phase) for each phase as soon as its JSON object is
+        complete, then ("playbook", full_result) once the response ends
+        """
+        if not self.is_available():
+            playbook = self._mock_playbook(failed_agent, impacted_agents)
+            for step in playbook["steps"]:
+                yield "step", step
+            yield "playbook", playbook
+            return
+        
+        prompt = self._playbook_prompt(failed_agent, impacted_agents, incident_analysis)
+        key = self.cache.key(MODEL_NAME, prompt)
+        parser = _StepStreamParser()
+        streamed: List[Dict[str, Any]] = []
+        
+        cached = await self.cache.get(key)
+        try:
+            if cached is not None:
+                for step in parser.feed(cached):
+                    yield "step", step
+                yield "playbook", json.loads(cached)
+                return
+            
+            model = await self._ensure_model()
+            if model is None:
+                raise GeminiUnavailableError("Gemini model could not be initialized")
+            self._interactive_started()
+            slot_held = False
+            try:
+                # Queue for a slot before the breaker and the deadline see the call
+                await self._interactive_slot()
+                slot_held = True
+                if not self.breaker.allow():
+                    raise GeminiUnavailableError("Gemini circuit breaker is open")
+                try:
+                    # The deadline applies to the first chunk and to every gap
+                    # between chunks, so a stalled stream fails fast
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(prompt, stream=True), GEMINI_TIMEOUT_SECONDS
+                    )
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), GEMINI_TIMEOUT_SECONDS)
+                        except StopAsyncIteration:
+                            break
+                        for step in parser.feed(chunk.text):
+                            streamed.append(step)
+                            yield "step", step
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.release()
+                    raise
+                except Exception:
+                    self.breaker.record_failure()
+                    raise
+            finally:
+                if slot_held:
+                    self._semaphore.release()
+                self._interactive_done()
+            self.breaker.record_success()
+            
+            text = parser.buffer.strip()
+            result = json.loads(text)
+            await self.cache.put(key, MODEL_NAME, text)
+            yield "playbook", result
+        except Exception as e:
+            print(f"Gemini API error: {e}")
+            fallback = self._mock_playbook(failed_agent, impacted_agents)
+            if streamed:
+                fallback["steps"] = streamed
+            else:
+                for step in fallback["steps"]:
+                    yield "step", step
+            yield "playbook", fallback
+    
+    def _playbook_prompt(
+        self,
+        failed_agent: Dict[str, Any],
+        impacted_agents: List[Dict[str, Any]],
+        incident_analysis: Dict[str, Any]
+    ) -> str:
+        return f"""You are an expert SRE (Site Reliability Engineer) creating incident response playbooks.
 
 **Incident Context:**
 - Failed Agent: {failed_agent['name']} ({failed_agent['type']})
@@ -147,14 +779,6 @@ Respond in JSON format:
 }}
 
 Respond with ONLY valid JSON, no markdown."""
-
-        try:
-            response = self.model.generate_content(prompt)
-            result = json.loads(response.text.strip())
-            return result
-        except Exception as e:
-            print(f"Gemini API error: {e}")
-            return self._mock_playbook(failed_agent, impacted_agents)
     
     async def explain_risk_assessment(
         self,
@@ -180,12 +804,89 @@ Uptime: {agent.get('uptime', 'unknown')}
 Be concise and technical. Focus on the key risk factors."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return await self._generate(prompt)
         except Exception as e:
             print(f"Gemini API error: {e}")
             return self._mock_risk_explanation(agent, risk_score, is_spof)
     
+    async def explain_risk_bulk(
+        self,
+        items: List[Dict[str, Any]],
+        batch_size: int = RISK_EXPLAIN_BATCH_SIZE,
+        max_concurrency: int = RISK_EXPLAIN_MAX_CONCURRENCY
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Risk explanations for many agents. Each item carries agent,
+        risk_score, is_spof and downstream_count. Agents with identical
+        inputs share one explanation; the rest are packed batch_size to a
+        prompt, batches run at most max_concurrency at a time, and results
+        are yielded as each batch completes as {"agent_id", "explanation"}.
+        """
+        groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for item in items:
+            agent = item["agent"]
+            key = (
+                agent["name"], agent["type"], agent.get("uptime", "unknown"),
+                item["risk_score"], item["is_spof"], item["downstream_count"]
+            )
+            groups.setdefault(key, []).append(item)
+        unique = [members[0] for members in groups.values()]
+        batches = [unique[i:i + batch_size] for i in range(0, len(unique), batch_size)]
+        
+        limiter = asyncio.Semaphore(max_concurrency)
+        tasks = [asyncio.create_task(self._explain_risk_batch(batch, limiter)) for batch in batches]
+        members_of = {id(members[0]): members for members in groups.values()}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for item, explanation in await finished:
+                    for member in members_of[id(item)]:
+                        yield {"agent_id": member["agent"]["id"], "explanation": explanation}
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _explain_risk_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        limiter: asyncio.Semaphore
+    ) -> List[Tuple[Dict[str, Any], str]]:
+        """One multi-agent prompt; agents it misses fall back to single calls"""
+        explanations: Dict[str, str] = {}
+        if self.is_available() and len(batch) > 1:
+            agents_text = "\n".join(
+                f"- id: {item['agent']['id']} | name: {item['agent']['name']} | type: {item['agent']['type']} | "
+                f"risk score: {item['risk_score']}/10 | single point of failure: {item['is_spof']} | "
+                f"downstream dependencies: {item['downstream_count']} | uptime: {item['agent'].get('uptime', 'unknown')}"
+                for item in batch
+            )
+            prompt = f"""For each agent below, explain in 2-3 sentences why it has its risk score.
+Be concise and technical. Focus on the key risk factors.
+
+{agents_text}
+
+Respond in JSON mapping each agent id to its explanation:
+{{"agent-id": "explanation"}}
+
+Respond with ONLY valid JSON."""
+            try:
+                async with limiter:
+                    result = await self._generate(prompt, as_json=True)
+                explanations = {k: v for k, v in result.items() if isinstance(v, str)}
+            except Exception as e:
+                print(f"Gemini API error: {e}")
+        
+        missing = [item for item in batch if item["agent"]["id"] not in explanations]
+        
+        async def single(item: Dict[str, Any]) -> str:
+            async with limiter:
+                return await self.explain_risk_assessment(
+                    item["agent"], item["risk_score"], item["is_spof"], item["downstream_count"]
+                )
+        
+        for item, text in zip(missing, await asyncio.gather(*(single(i) for i in missing))):
+            explanations[item["agent"]["id"]] = text
+        return [(item, explanations[item["agent"]["id"]]) for item in batch]
+    
     async def generate_evidence_reasoning(
         self,
         dependency: Dict[str, Any],
@@ -213,13 +914,110 @@ Provide reasoning in JSON:
 Respond with ONLY valid JSON."""
 
         try:
-            response = self.model.generate_content(prompt)
-            result = json.loads(response.text.strip())
+            result = await self._generate(prompt, as_json=True)
             return result
         except Exception as e:
             print(f"Gemini API error: {e}")
             return self._mock_evidence_reasoning(dependency)
     
+    def _evidence_key(self, dependency: Dict[str, Any]) -> str:
+        return self.cache.key(
+            MODEL_NAME,
+            f"evidence:{dependency['source']}>{dependency['target']}:{dependency['type']}:{dependency['confidence']}"
+        )
+    
+    async def generate_evidence_bulk(
+        self,
+        dependencies: List[Dict[str, Any]],
+        group_by: str = "source",
+        batch_size: int = EVIDENCE_BATCH_SIZE,
+        max_concurrency: int = EVIDENCE_MAX_CONCURRENCY,
+        requests_per_minute: float = EVIDENCE_REQUESTS_PER_MINUTE
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Evidence reasoning for many dependency edges.
+        Edges are grouped by source agent (or by type), packed batch_size to
+        a prompt and run concurrently under a rate limit. Results are cached
+        per edge on (source, target, type, confidence), so repeat runs only
+        prompt for new or changed edges. Yields {"dependency", "reasoning",
+        "origin"} with origin one of cached/gemini/fallback, as they finish.
+        """
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        keys = [self._evidence_key(dep) for dep in dependencies]
+        found = await self.cache.get_many(keys)
+        for dep, key in zip(dependencies, keys):
+            cached = found.get(key)
+            if cached is not None:
+                yield {"dependency": dep, "reasoning": json.loads(cached), "origin": "cached"}
+            else:
+                pending.setdefault(str(dep.get(group_by, "")), []).append(dep)
+        
+        batches = [
+            group[i:i + batch_size]
+            for group in pending.values()
+            for i in range(0, len(group), batch_size)
+        ]
+        limiter = asyncio.Semaphore(max_concurrency)
+        rate = _RateLimiter(requests_per_minute)
+        tasks = [asyncio.create_task(self._evidence_batch(batch, limiter, rate)) for batch in batches]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _evidence_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        limiter: asyncio.Semaphore,
+        rate: _RateLimiter
+    ) -> List[Dict[str, Any]]:
+        """One multi-edge prompt; edges it misses fall back to the mock reasoning"""
+        parsed: Dict[str, Any] = {}
+        if self.is_available():
+            edges_text = "\n".join(
+                f"- e{i}: {dep['source']} → {dep['target']} | type: {dep['type']} | confidence: {dep['confidence']}"
+                for i, dep in enumerate(batch)
+            )
+            prompt = f"""Analyze these agent dependencies and provide reasoning for each:
+
+{edges_text}
+
+Provide reasoning in JSON, keyed by edge id:
+{{
+  "e0": {{
+    "reasoning": "Why this dependency exists",
+    "confidence_factors": ["Factor 1", "Factor 2"],
+    "risk_if_broken": "What happens if this dependency breaks"
+  }}
+}}
+
+Respond with ONLY valid JSON."""
+            try:
+                async with limiter:
+                    await rate.acquire()
+                    parsed = await self._generate(prompt, as_json=True)
+            except Exception as e:
+                print(f"Gemini API error: {e}")
+        
+        results = []
+        fresh: Dict[str, str] = {}
+        for i, dep in enumerate(batch):
+            reasoning = parsed.get(f"e{i}") if isinstance(parsed, dict) else None
+            if isinstance(reasoning, dict) and "reasoning" in reasoning:
+                fresh[self._evidence_key(dep)] = json.dumps(reasoning)
+                results.append({"dependency": dep, "reasoning": reasoning, "origin": "gemini"})
+            else:
+                results.append({
+                    "dependency": dep,
+                    "reasoning": self._mock_evidence_reasoning(dep),
+                    "origin": "fallback"
+                })
+        await self.cache.put_many(MODEL_NAME, fresh)
+        return results
+    
     # Mock fallback methods for when API is not available
     
     def _mock_incident_analysis(self, failed_agent, impacted_agents):
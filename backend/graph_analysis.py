@@ -0,0 +1,478 @@
+"""
+Graph Analysis for AgentGuard
+Topology-derived risk analysis over an AgentGraph, cached per scan:
+- Single points of failure (articulation points + dominator tree)
+- Circular dependencies (non-trivial SCCs + sampled concrete cycles)
+- Deterministic per-agent risk scores and overall risk
+- Layered (Sugiyama-style) layout
+"""
+
+from collections import deque
+from typing import Dict, List, Any, Optional
+import numpy as np
+
+from graph_engine import AgentGraph
+
+# Bounds on the concrete cycles reported alongside the SCCs
+MAX_CYCLES_PER_COMPONENT = 3
+MAX_CYCLES_TOTAL = 25
+# ...and on the BFS starts tried per SCC; each one may search the whole SCC
+MAX_CYCLE_STARTS_PER_COMPONENT = 4 * MAX_CYCLES_PER_COMPONENT
+
+# Risk score weights; each factor is normalized to 0-1 before weighting
+RISK_WEIGHTS = {
+    "centrality": 0.35,
+    "in_degree": 0.15,
+    "traffic": 0.15,
+    "downtime": 0.20,
+    "latency": 0.15,
+}
+PAGERANK_DAMPING = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOL = 1e-10
+# Uptime at or below this counts as fully unreliable
+DOWNTIME_FLOOR = 95.0
+
+# Layout geometry (pixels) and barycenter sweeps per layout
+LAYOUT_X_SPACING = 200
+LAYOUT_Y_SPACING = 150
+LAYOUT_ORIGIN = {"x": 100, "y": 50}
+LAYOUT_SWEEPS = 4
+
+
+def articulation_points(graph: AgentGraph) -> List[bool]:
+    """
+    Cut vertices of the undirected view of the dependency graph
+    (iterative Hopcroft-Tarjan, O(V+E))
+    """
+    n = graph.node_count
+    neighbours = [set() for _ in range(n)]
+    for s, t in zip(graph.edge_sources, graph.edge_targets):
+        if s != t:
+            neighbours[s].add(t)
+            neighbours[t].add(s)
+    adjacency = [list(ns) for ns in neighbours]
+
+    disc = [-1] * n
+    low = [0] * n
+    is_cut = [False] * n
+    counter = 0
+
+    for root in range(n):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = counter
+        counter += 1
+        root_children = 0
+        # Each frame is (node, parent, position of the next neighbour to visit)
+        work = [(root, -1, 0)]
+        while work:
+            v, parent, pos = work[-1]
+            if pos < len(adjacency[v]):
+                work[-1] = (v, parent, pos + 1)
+                w = adjacency[v][pos]
+                if disc[w] == -1:
+                    disc[w] = low[w] = counter
+                    counter += 1
+                    if v == root:
+                        root_children += 1
+                    work.append((w, v, 0))
+                elif w != parent and disc[w] < low[v]:
+                    low[v] = disc[w]
+                continue
+
+            work.pop()
+            if parent != -1:
+                if low[v] < low[parent]:
+                    low[parent] = low[v]
+                if parent != root and low[v] >= disc[parent]:
+                    is_cut[parent] = True
+        if root_children > 1:
+            is_cut[root] = True
+
+    return is_cut
+
+
+def immediate_dominators(graph: AgentGraph) -> List[int]:
+    """
+    Immediate dominator of every node in the directed call graph, seen from
+    a virtual root wired to every node of each source SCC (the entry points).
+    Entries dominated only by the virtual root get -1.
+    Lengauer-Tarjan with iterative path compression.
+    """
+    n = graph.node_count
+    comp_of, components = graph.components
+    has_incoming = [False] * len(components)
+    for s, t in zip(graph.edge_sources, graph.edge_targets):
+        if comp_of[s] != comp_of[t]:
+            has_incoming[comp_of[t]] = True
+    entries = [v for v in range(n) if not has_incoming[comp_of[v]]]
+
+    root = n
+    successors = graph.successors
+    predecessors = graph.predecessors
+    is_entry = [False] * n
+    for v in entries:
+        is_entry[v] = True
+
+    # DFS numbering from the virtual root; everything below is in dfnum space
+    dfnum = [-1] * (n + 1)
+    vertex: List[int] = []
+    parent: List[int] = []
+    dfnum[root] = 0
+    vertex.append(root)
+    parent.append(-1)
+    work = [(root, 0)]
+    while work:
+        v, pos = work[-1]
+        succ = entries if v == root else successors[v]
+        if pos < len(succ):
+            work[-1] = (v, pos + 1)
+            w = succ[pos]
+            if dfnum[w] == -1:
+                dfnum[w] = len(vertex)
+                vertex.append(w)
+                parent.append(dfnum[v])
+                work.append((w, 0))
+            continue
+        work.pop()
+
+    size = len(vertex)
+    semi = list(range(size))
+    label = list(range(size))
+    ancestor = [-1] * size
+    idom = [0] * size
+    bucket: List[List[int]] = [[] for _ in range(size)]
+
+    def evaluate(v: int) -> int:
+        if ancestor[v] == -1:
+            return v
+        path = []
+        x = v
+        while ancestor[ancestor[x]] != -1:
+            path.append(x)
+            x = ancestor[x]
+        for x in reversed(path):
+            a = ancestor[x]
+            if semi[label[a]] < semi[label[x]]:
+                label[x] = label[a]
+            ancestor[x] = ancestor[a]
+        return label[v]
+
+    for w in range(size - 1, 0, -1):
+        node = vertex[w]
+        preds = [dfnum[p] for p in predecessors[node]]
+        if is_entry[node]:
+            preds.append(0)
+        for v in preds:
+            if v == -1:
+                continue
+            u = evaluate(v)
+            if semi[u] < semi[w]:
+                semi[w] = semi[u]
+        bucket[semi[w]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = evaluate(v)
+            idom[v] = u if semi[u] < semi[v] else p
+        bucket[p] = []
+
+    for w in range(1, size):
+        if idom[w] != semi[w]:
+            idom[w] = idom[idom[w]]
+
+    result = [-1] * n
+    for w in range(1, size):
+        d = idom[w]
+        result[vertex[w]] = vertex[d] if d != 0 else -1
+    return result
+
+
+def _compute_spofs(graph: AgentGraph) -> Dict[str, Any]:
+    is_cut = articulation_points(graph)
+    idom = immediate_dominators(graph)
+
+    # Dominator subtree sizes; a reversed preorder visits children first
+    n = graph.node_count
+    children: List[List[int]] = [[] for _ in range(n)]
+    for v, d in enumerate(idom):
+        if d != -1:
+            children[d].append(v)
+    dominated = [0] * n
+    order: List[int] = []
+    stack = [v for v in range(n) if idom[v] == -1]
+    while stack:
+        v = stack.pop()
+        order.append(v)
+        stack.extend(children[v])
+    for v in reversed(order):
+        for c in children[v]:
+            dominated[v] += dominated[c] + 1
+
+    details: Dict[str, Dict[str, Any]] = {}
+    for agent in graph.agents:
+        v = graph.index[agent["id"]]
+        if is_cut[v] or dominated[v] > 0:
+            details[agent["id"]] = {
+                "articulation_point": is_cut[v],
+                "dominates": dominated[v],
+            }
+    ranked = sorted(
+        details,
+        key=lambda a: (-details[a]["dominates"], not details[a]["articulation_point"], graph.index[a]),
+    )
+    return {"spof_agents": ranked, "spof_details": details}
+
+
+def single_points_of_failure(graph: AgentGraph) -> Dict[str, Any]:
+    """
+    Agents whose failure disconnects the topology (articulation points) or
+    cuts every call path into some other agent (non-trivial dominators),
+    ranked by how many agents they dominate
+    """
+    return graph.cached("spofs", lambda: _compute_spofs(graph))
+
+
+def _shortest_cycle_through(graph: AgentGraph, start: int, comp: int) -> Optional[List[int]]:
+    """Shortest cycle start -> ... -> start, searching only inside start's SCC"""
+    comp_of = graph.components[0]
+    successors = graph.successors
+    parent = {start: -1}
+    queue = deque([start])
+    while queue:
+        v = queue.popleft()
+        for w in successors[v]:
+            if w == start:
+                path = [v]
+                while path[-1] != start:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                return path
+            if comp_of[w] == comp and w not in parent:
+                parent[w] = v
+                queue.append(w)
+    return None
+
+
+def _compute_cycles(graph: AgentGraph) -> Dict[str, Any]:
+    comp_of, components = graph.components
+    ids = graph.ids
+
+    cyclic = []
+    for comp, members in enumerate(components):
+        if len(members) > 1:
+            cyclic.append((comp, members))
+        elif members[0] in graph.successors[members[0]]:
+            cyclic.append((comp, members))
+    # Largest SCCs first; they carry the most cascade risk
+    cyclic.sort(key=lambda cm: -len(cm[1]))
+
+    cycles: List[List[str]] = []
+    for comp, members in cyclic:
+        if len(cycles) >= MAX_CYCLES_TOTAL:
+            break
+        seen = set()
+        on_cycle = set()
+        found = 0
+        attempts = 0
+        for start in sorted(members):
+            if found >= MAX_CYCLES_PER_COMPONENT or attempts >= MAX_CYCLE_STARTS_PER_COMPONENT:
+                break
+            if len(cycles) >= MAX_CYCLES_TOTAL:
+                break
+            # The shortest cycle through a node on a reported cycle is
+            # usually that same cycle; start from nodes not yet covered
+            if start in on_cycle:
+                continue
+            attempts += 1
+            path = _shortest_cycle_through(graph, start, comp)
+            if path is None:
+                continue
+            # Rotate to the smallest node so the same cycle is reported once
+            pivot = path.index(min(path))
+            key = tuple(path[pivot:] + path[:pivot])
+            if key in seen:
+                continue
+            seen.add(key)
+            on_cycle.update(key)
+            found += 1
+            cycles.append([ids[v] for v in key] + [ids[key[0]]])
+
+    return {
+        "circular_dependencies": cycles,
+        "cyclic_components": [sorted(ids[v] for v in members) for _, members in cyclic],
+    }
+
+
+def circular_dependencies(graph: AgentGraph) -> Dict[str, Any]:
+    """
+    Every non-trivial SCC of the call graph (two or more agents, or a
+    self-call), plus a bounded sample of concrete cycles through them
+    """
+    return graph.cached("cycles", lambda: _compute_cycles(graph))
+
+
+def pagerank(graph: AgentGraph) -> np.ndarray:
+    """
+    PageRank over dependency edges weighted by confidence, by power
+    iteration with a bincount sparse mat-vec. Agents that many others call
+    (directly or transitively) rank highest.
+    """
+    n = graph.node_count
+    if n == 0:
+        return np.zeros(0)
+    src = np.asarray(graph.edge_sources, dtype=np.int64)
+    dst = np.asarray(graph.edge_targets, dtype=np.int64)
+    weight = np.asarray([float(d.get("confidence", 1.0)) for d in graph.dependencies])
+    out_weight = np.bincount(src, weights=weight, minlength=n)
+    dangling = out_weight == 0
+    edge_share = weight / np.where(out_weight[src] > 0, out_weight[src], 1.0)
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_MAX_ITER):
+        spread = np.bincount(dst, weights=rank[src] * edge_share, minlength=n)
+        leaked = rank[dangling].sum()
+        updated = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * (spread + leaked / n)
+        done = np.abs(updated - rank).sum() < PAGERANK_TOL
+        rank = updated
+        if done:
+            break
+    return rank
+
+
+def _parse_percent(value: Any, default: float) -> float:
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return default
+
+
+def _log_scaled(values: np.ndarray) -> np.ndarray:
+    scaled = np.log1p(np.maximum(values, 0))
+    top = scaled.max() if len(scaled) else 0
+    return scaled / top if top > 0 else np.zeros_like(scaled)
+
+
+def _compute_risk(graph: AgentGraph) -> Dict[str, Any]:
+    agents = graph.agents
+    if not agents:
+        return {"risk_scores": {}, "overall_risk": 0.0}
+    rows = np.asarray([graph.index[a["id"]] for a in agents], dtype=np.int64)
+
+    rank = pagerank(graph)[rows]
+    in_degree = np.bincount(
+        np.asarray(graph.edge_targets, dtype=np.int64), minlength=graph.node_count
+    )[rows].astype(float)
+    traffic = np.asarray([float(a.get("requests_per_min", 0) or 0) for a in agents])
+    latency = np.asarray([float(a.get("avg_latency_ms", 0) or 0) for a in agents])
+    uptime = np.asarray([_parse_percent(a.get("uptime", "100%"), 100.0) for a in agents])
+
+    factors = {
+        "centrality": rank / rank.max() if rank.max() > 0 else np.zeros_like(rank),
+        "in_degree": _log_scaled(in_degree),
+        "traffic": _log_scaled(traffic),
+        "downtime": np.clip((100.0 - uptime) / (100.0 - DOWNTIME_FLOOR), 0.0, 1.0),
+        "latency": _log_scaled(latency),
+    }
+    scores = 10.0 * sum(RISK_WEIGHTS[name] * values for name, values in factors.items())
+    scores = np.round(scores, 2)
+
+    # Overall risk: the riskiest decile of agents, raised by the share of
+    # agents that are single points of failure
+    top = np.sort(scores)[::-1][:max(1, len(scores) // 10)]
+    spof_share = len(single_points_of_failure(graph)["spof_agents"]) / len(agents)
+    overall = min(10.0, 0.75 * float(top.mean()) + 2.5 * spof_share)
+
+    return {
+        "risk_scores": dict(zip((a["id"] for a in agents), scores.tolist())),
+        "overall_risk": round(overall, 1),
+    }
+
+
+def risk_assessment(graph: AgentGraph) -> Dict[str, Any]:
+    """
+    Deterministic 0-10 risk score per agent from call-graph centrality,
+    in-degree, traffic, uptime and latency, plus an overall graph risk
+    """
+    return graph.cached("risk", lambda: _compute_risk(graph))
+
+
+def _layer_nodes(graph: AgentGraph) -> List[List[int]]:
+    """
+    Longest-path layering of the SCC condensation: entry points on layer 0,
+    every callee strictly below its callers, SCC members sharing a layer
+    """
+    comp_of, components = graph.components
+    layer = [0] * len(components)
+    # Reverse topological numbering, so walking it backwards visits callers
+    # before callees
+    for comp in range(len(components) - 1, -1, -1):
+        for v in components[comp]:
+            for w in graph.successors[v]:
+                other = comp_of[w]
+                if other != comp and layer[comp] + 1 > layer[other]:
+                    layer[other] = layer[comp] + 1
+
+    layers: List[List[int]] = [[] for _ in range(max(layer, default=-1) + 1)]
+    for v in range(graph.node_count):
+        layers[layer[comp_of[v]]].append(v)
+    return layers
+
+
+def _order_layers(graph: AgentGraph, layers: List[List[int]]) -> None:
+    """Reduce edge crossings in place with alternating barycenter sweeps"""
+    position = [0] * graph.node_count
+    for nodes in layers:
+        for i, v in enumerate(nodes):
+            position[v] = i
+
+    def sweep(ordered: List[List[int]], neighbours: List[List[int]]) -> None:
+        for nodes in ordered[1:]:
+            keyed = []
+            for v in nodes:
+                adjacent = [position[w] for w in neighbours[v]]
+                centre = sum(adjacent) / len(adjacent) if adjacent else position[v]
+                keyed.append((centre, position[v], v))
+            keyed.sort()
+            for i, (_, _, v) in enumerate(keyed):
+                nodes[i] = v
+                position[v] = i
+
+    for i in range(LAYOUT_SWEEPS):
+        if i % 2 == 0:
+            sweep(layers, graph.predecessors)
+        else:
+            sweep(layers[::-1], graph.successors)
+
+
+def _compute_layout(graph: AgentGraph) -> Dict[str, Dict[str, int]]:
+    layers = _layer_nodes(graph)
+    _order_layers(graph, layers)
+
+    # Only scanned agents are drawn; dependency-only ids shape the layering
+    # but take no slot
+    ids = graph.ids
+    agents_by_id = graph.agents_by_id
+    rows = [[ids[v] for v in nodes if ids[v] in agents_by_id] for nodes in layers]
+    rows = [row for row in rows if row]
+
+    widest = max((len(row) for row in rows), default=0)
+    positions: Dict[str, Dict[str, int]] = {}
+    for depth, row in enumerate(rows):
+        # Centre each layer under the widest one
+        offset = (widest - len(row)) * LAYOUT_X_SPACING // 2
+        for i, agent_id in enumerate(row):
+            positions[agent_id] = {
+                "x": LAYOUT_ORIGIN["x"] + offset + i * LAYOUT_X_SPACING,
+                "y": LAYOUT_ORIGIN["y"] + depth * LAYOUT_Y_SPACING,
+            }
+    return positions
+
+
+def hierarchical_layout(graph: AgentGraph) -> Dict[str, Dict[str, int]]:
+    """
+    Node positions from a layered layout of the dependency DAG: callers
+    above callees, layers ordered by barycenter to limit crossings
+    """
+    return graph.cached("layout", lambda: _compute_layout(graph))
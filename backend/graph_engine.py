@@ -0,0 +1,868 @@
+"""
+Graph Engine for AgentGuard
+Indexed view of a scanned agent topology, built once per scan:
+- Interned node ids (agents plus dependency-only ids)
+- O(1) agent lookup by id
+- Forward/reverse adjacency arrays
+- O(V+E) blast-radius traversal
+- Strongly connected components and a per-scan, memory-bounded transitive-closure cache
+- Compact binary serialization of the graph and its derived indexes
+- Incremental topology updates that carry SCCs and the closure forward
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
+import numpy as np
+
+# Memory budget of one graph's transitive-closure rows
+CLOSURE_CACHE_MB = float(os.getenv("CLOSURE_CACHE_MB", "64"))
+
+
+def strongly_connected_components(successors: List[List[int]]) -> Tuple[List[int], List[List[int]]]:
+    """
+    Iterative Tarjan SCC over an adjacency list.
+    Returns (comp_of, components); components are emitted in reverse
+    topological order, so every edge between components points from a
+    higher component index to a lower one.
+    """
+    n = len(successors)
+    index_of = [-1] * n
+    lowlink = [0] * n
+    on_stack = bytearray(n)
+    comp_of = [-1] * n
+    components: List[List[int]] = []
+    stack: List[int] = []
+    counter = 0
+
+    for root in range(n):
+        if index_of[root] != -1:
+            continue
+        # Each frame is (node, position of the next successor to visit)
+        work = [(root, 0)]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        while work:
+            v, pos = work[-1]
+            succ = successors[v]
+            if pos < len(succ):
+                work[-1] = (v, pos + 1)
+                w = succ[pos]
+                if index_of[w] == -1:
+                    index_of[w] = lowlink[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = 1
+                    work.append((w, 0))
+                elif on_stack[w] and index_of[w] < lowlink[v]:
+                    lowlink[v] = index_of[w]
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[v] < lowlink[parent]:
+                    lowlink[parent] = lowlink[v]
+            if lowlink[v] == index_of[v]:
+                comp = len(components)
+                members = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = 0
+                    comp_of[w] = comp
+                    members.append(w)
+                    if w == v:
+                        break
+                components.append(members)
+
+    return comp_of, components
+
+
+def bits_to_indices(bits: int) -> List[int]:
+    """Positions of the set bits of a Python int bitset, ascending"""
+    digits = bin(bits)[:1:-1]
+    out = []
+    i = digits.find("1")
+    while i != -1:
+        out.append(i)
+        i = digits.find("1", i + 1)
+    return out
+
+
+def indices_to_bits(indices: List[int], n: int) -> int:
+    """Python int bitset with the given positions (all below n) set"""
+    if len(indices) < 64:
+        bits = 0
+        for i in indices:
+            bits |= 1 << i
+        return bits
+    mask = np.zeros(n, dtype=np.uint8)
+    mask[indices] = 1
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def component_reach(
+    members: List[int],
+    comp: int,
+    comp_of: List[int],
+    successors: List[List[int]],
+    reach: Union[List[int], Dict[int, int]]
+) -> int:
+    """
+    Reach bitset of one component: its members OR-ed with the reach sets of
+    the components they call, which must already be filled in `reach`
+    """
+    bits = 0
+    for v in members:
+        bits |= 1 << v
+    for v in members:
+        for w in successors[v]:
+            other = comp_of[w]
+            if other != comp:
+                bits |= reach[other]
+    return bits
+
+
+class ClosureCache:
+    """
+    Transitive closure of an AgentGraph as one int bitset per SCC, held
+    within a memory budget. When every row fits (components x nodes / 8
+    bytes under the budget) all rows are built up front over the condensed
+    DAG in reverse topological order, each component's reach set being its
+    own members OR-ed with the reach sets of the components it calls.
+    Larger graphs get rows on first use instead, from a walk over the
+    condensed DAG that reuses any cached descendant rows, kept in an LRU
+    evicted down to the budget. Members of an SCC share one row. Safe to
+    query from worker threads: the LRU is updated under a lock, while rows
+    are computed outside it.
+    """
+
+    def __init__(self, graph: "AgentGraph", rows: Optional[Dict[int, int]] = None):
+        started = time.perf_counter()
+        comp_of, components = graph.components
+        self.graph = graph
+        self.comp_of = comp_of
+        self.budget_bytes = int(CLOSURE_CACHE_MB * 1024 * 1024)
+        self._rows: "OrderedDict[int, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if rows is None and len(components) * (graph.node_count // 8 + 32) <= self.budget_bytes:
+            successors = graph.successors
+            reach = [0] * len(components)
+            for comp, members in enumerate(components):
+                reach[comp] = component_reach(members, comp, comp_of, successors, reach)
+            rows = dict(enumerate(reach))
+        with self._lock:
+            for comp, bits in (rows or {}).items():
+                self._store(comp, bits)
+        self.build_ms = (time.perf_counter() - started) * 1000
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def complete(self) -> bool:
+        """True when every component's row is held"""
+        return len(self._rows) == len(self.graph.components[1])
+
+    def rows(self) -> Dict[int, int]:
+        """Rows currently held, by component"""
+        with self._lock:
+            return dict(self._rows)
+
+    def cached_row(self, comp: int) -> Optional[int]:
+        """Row of a component if it is held, without computing it"""
+        return self._rows.get(comp)
+
+    def reach_of(self, comp: int) -> int:
+        """Bitset of every node reachable from component comp, its members included"""
+        with self._lock:
+            bits = self._rows.get(comp)
+            if bits is not None:
+                self.hits += 1
+                self._rows.move_to_end(comp)
+                return bits
+            self.misses += 1
+        bits = self._compute(comp)
+        with self._lock:
+            self._store(comp, bits)
+        return bits
+
+    def _compute(self, comp: int) -> int:
+        comp_of, components = self.graph.components
+        successors = self.graph.successors
+        rows = self._rows
+        nodes: List[int] = []
+        bits = 0
+        seen = {comp}
+        stack = [comp]
+        while stack:
+            c = stack.pop()
+            cached = rows.get(c) if c != comp else None
+            if cached is not None:
+                bits |= cached
+                continue
+            members = components[c]
+            nodes.extend(members)
+            for v in members:
+                for w in successors[v]:
+                    d = comp_of[w]
+                    if d not in seen:
+                        seen.add(d)
+                        stack.append(d)
+        return bits | indices_to_bits(nodes, self.graph.node_count)
+
+    def _store(self, comp: int, bits: int) -> None:
+        # Caller holds self._lock; a row computed twice concurrently is
+        # stored once
+        previous = self._rows.pop(comp, None)
+        if previous is not None:
+            self._bytes -= sys.getsizeof(previous)
+        self._rows[comp] = bits
+        self._bytes += sys.getsizeof(bits)
+        while self._bytes > self.budget_bytes and len(self._rows) > 1:
+            _, evicted = self._rows.popitem(last=False)
+            self._bytes -= sys.getsizeof(evicted)
+            self.evictions += 1
+
+    def reach_bits(self, node: int) -> int:
+        """Bitset of every node reachable from node, excluding node itself"""
+        return self.reach_of(self.comp_of[node]) & ~(1 << node)
+
+    def impacted_count(self, agent_id: str) -> int:
+        node = self.graph.index.get(agent_id)
+        if node is None:
+            return 0
+        return self.reach_of(self.comp_of[node]).bit_count() - 1
+
+    def reachable(self, agent_id: str) -> List[str]:
+        """Same node set as AgentGraph.reachable, as a cache lookup"""
+        node = self.graph.index.get(agent_id)
+        if node is None:
+            return []
+        ids = self.graph.ids
+        return [ids[i] for i in bits_to_indices(self.reach_bits(node))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "components": len(self.graph.components[1]),
+            "rows_cached": len(self._rows),
+            "build_ms": round(self.build_ms, 3),
+            "memory_bytes": self.memory_bytes,
+            "budget_bytes": self.budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class GraphBuilder:
+    """
+    Collects agents and dependencies one record at a time, interning node
+    ids as they arrive, for AgentGraph.from_builder. Endpoint strings in
+    stored dependencies are the interned id objects, so each id is held
+    once however many edges mention it. A repeated agent id replaces the
+    earlier record.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.agents_by_id: Dict[str, Dict[str, Any]] = {}
+        self.dependencies: List[Dict[str, Any]] = []
+        self.edge_sources: List[int] = []
+        self.edge_targets: List[int] = []
+
+    def intern(self, node_id: str) -> int:
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = len(self.ids)
+            self.index[node_id] = idx
+            self.ids.append(node_id)
+        return idx
+
+    def add_agent(self, agent: Dict[str, Any]) -> None:
+        agent["id"] = self.ids[self.intern(agent["id"])]
+        self.agents_by_id[agent["id"]] = agent
+
+    def add_dependency(self, dep: Dict[str, Any]) -> None:
+        s = self.intern(dep["source"])
+        t = self.intern(dep["target"])
+        dep["source"] = self.ids[s]
+        dep["target"] = self.ids[t]
+        self.dependencies.append(dep)
+        self.edge_sources.append(s)
+        self.edge_targets.append(t)
+
+
+# Derived indexes persisted next to a serialized graph, each written once
+# per scan version. The closure is left out: it is O(V^2) in the worst case
+# and rebuilt lazily, row by row, from the components.
+PERSISTED_INDEXES = ("components", "content_hash", "topology_hash", "graph_data")
+
+GRAPH_FORMAT_MAGIC = b"AGG1"
+
+# Incremental updates re-run SCC and closure over the affected ancestors
+# only, unless they cover more than this share of the graph
+FULL_RECOMPUTE_FRACTION = 0.5
+
+
+def _cached_bytes(value: Any) -> int:
+    """Approximate size of a cached analysis result (2x its JSON encoding)"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (dict, list)):
+        return 2 * len(json.dumps(value, separators=(",", ":"), default=str))
+    return sys.getsizeof(value)
+
+
+class AgentGraph:
+    """
+    Immutable index over the agents and dependencies of one scan.
+    Topology changes go through with_changes(), which returns a new graph.
+    """
+
+    def __init__(
+        self,
+        agents: List[Dict[str, Any]],
+        dependencies: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ):
+        self.agents = agents
+        self.dependencies = dependencies
+
+        # Intern node ids: scanned agents first (in scan order), then any
+        # dependency endpoint that was never reported as an agent. A given
+        # `ids` order (from a serialized graph) is interned first instead.
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.agents_by_id: Dict[str, Dict[str, Any]] = {}
+        for node_id in ids or ():
+            self._intern(node_id)
+        for agent in agents:
+            self.agents_by_id[agent["id"]] = agent
+            self._intern(agent["id"])
+
+        self.edge_sources: List[int] = []
+        self.edge_targets: List[int] = []
+        for dep in dependencies:
+            self.edge_sources.append(self._intern(dep["source"]))
+            self.edge_targets.append(self._intern(dep["target"]))
+
+        self._index_edges()
+
+    @classmethod
+    def from_builder(cls, builder: "GraphBuilder") -> "AgentGraph":
+        """Graph over records a GraphBuilder already validated and interned"""
+        graph = cls.__new__(cls)
+        graph.agents = list(builder.agents_by_id.values())
+        graph.dependencies = builder.dependencies
+        graph.ids = builder.ids
+        graph.index = builder.index
+        graph.agents_by_id = builder.agents_by_id
+        graph.edge_sources = builder.edge_sources
+        graph.edge_targets = builder.edge_targets
+        graph._index_edges()
+        return graph
+
+    def _index_edges(self) -> None:
+        # Adjacency arrays hold node indices; out_edges/in_edges hold the
+        # position of the originating entry in `dependencies`.
+        n = len(self.ids)
+        self.successors: List[List[int]] = [[] for _ in range(n)]
+        self.predecessors: List[List[int]] = [[] for _ in range(n)]
+        self.out_edges: List[List[int]] = [[] for _ in range(n)]
+        self.in_edges: List[List[int]] = [[] for _ in range(n)]
+        for e, (s, t) in enumerate(zip(self.edge_sources, self.edge_targets)):
+            self.successors[s].append(t)
+            self.predecessors[t].append(s)
+            self.out_edges[s].append(e)
+            self.in_edges[t].append(e)
+
+        # Derived indexes, built lazily on first use
+        self._components: Optional[Tuple[List[int], List[List[int]]]] = None
+        self._closure: Optional[ClosureCache] = None
+        self._cache: Dict[str, Any] = {}
+        # Estimated size of each _cache entry, measured when it is stored
+        self._cache_bytes: Dict[str, int] = {}
+
+    def _intern(self, node_id: str) -> int:
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = len(self.ids)
+            self.index[node_id] = idx
+            self.ids.append(node_id)
+        return idx
+
+    @property
+    def node_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def agent_count(self) -> int:
+        return len(self.agents)
+
+    @property
+    def components(self) -> Tuple[List[int], List[List[int]]]:
+        """(comp_of, components) from Tarjan SCC, cached for this scan"""
+        if self._components is None:
+            self._components = strongly_connected_components(self.successors)
+        return self._components
+
+    @property
+    def closure(self) -> ClosureCache:
+        """Transitive-closure cache, built on first blast-radius query"""
+        if self._closure is None:
+            self._closure = ClosureCache(self)
+        return self._closure
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Build cost of the closure cache, or built=False if not yet needed"""
+        if self._closure is None:
+            return {"built": False}
+        return {"built": True, **self._closure.stats()}
+
+    def memory_estimate(self) -> int:
+        """
+        Rough bytes held by this graph: the scan records, the adjacency
+        indexes, the closure cache once built, and every cached analysis
+        result (layout, graph data, risk, encoded responses)
+        """
+        total = self.cached("base_bytes", self._base_bytes)
+        if self._closure is not None:
+            total += self._closure.memory_bytes
+        for key, value in list(self._cache.items()):
+            size = self._cache_bytes.get(key)
+            if size is None:
+                size = self._cache_bytes[key] = _cached_bytes(value)
+            total += size
+        return total
+
+    def _base_bytes(self) -> int:
+        # Records are sized by their JSON encoding, roughly doubled for
+        # dict and str object overhead; each list holds 8-byte pointers to
+        # small interned ints.
+        records = 2 * len(json.dumps([self.agents, self.dependencies], separators=(",", ":")))
+        ids = sum(sys.getsizeof(i) for i in self.ids) + 2 * sys.getsizeof(self.index)
+        adjacency = 4 * sum(sys.getsizeof(a) for a in self.successors) + 16 * len(self.edge_sources)
+        return records + ids + adjacency
+
+    @property
+    def topology_hash(self) -> str:
+        """Hash of the node ids and edges (not agent metadata), in index order"""
+        return self.cached("topology_hash", self._hash_topology)
+
+    def _hash_topology(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\n".join(self.ids).encode())
+        digest.update(b"\0")
+        digest.update(",".join(f"{s}>{t}" for s, t in zip(self.edge_sources, self.edge_targets)).encode())
+        return digest.hexdigest()
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Version of the scan content (agent metadata included): a hash of
+        the full content for a scanned graph, or of the previous version and
+        the change set for one built by with_changes
+        """
+        return self.cached("content_hash", self._hash_content)
+
+    def _hash_content(self) -> str:
+        payload = json.dumps([self.agents, self.dependencies], sort_keys=True, separators=(",", ":"))
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def cached(self, key: str, build: Callable[[], Any]) -> Any:
+        """Memoize a derived analysis result for the lifetime of this scan"""
+        if key not in self._cache:
+            value = build()
+            self._cache_bytes[key] = _cached_bytes(value)
+            self._cache[key] = value
+        return self._cache[key]
+
+    def get_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Return the scanned agent record for an id, or None"""
+        return self.agents_by_id.get(agent_id)
+
+    def reachable(self, agent_id: str) -> List[str]:
+        """
+        Ids of every node reachable from agent_id along dependency edges,
+        excluding agent_id itself (BFS order)
+        """
+        start = self.index.get(agent_id)
+        if start is None:
+            return []
+
+        successors = self.successors
+        visited = bytearray(len(self.ids))
+        visited[start] = 1
+        order: List[int] = []
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for nxt in successors[current]:
+                if not visited[nxt]:
+                    visited[nxt] = 1
+                    order.append(nxt)
+                    queue.append(nxt)
+
+        ids = self.ids
+        return [ids[i] for i in order]
+
+    def agents_for(self, node_ids: List[str]) -> List[Dict[str, Any]]:
+        """Resolve node ids to agent records, skipping ids that are not scanned agents"""
+        agents_by_id = self.agents_by_id
+        return [agents_by_id[i] for i in node_ids if i in agents_by_id]
+
+    def built_indexes(self) -> List[str]:
+        """Names of the PERSISTED_INDEXES this graph has built so far"""
+        names = []
+        if self._components is not None:
+            names.append("components")
+        names.extend(k for k in PERSISTED_INDEXES[1:] if k in self._cache)
+        return names
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the scan itself: node ids, agents and dependencies.
+        Adjacency lists are not stored; they are rebuilt from the
+        dependencies in O(V+E). Derived indexes go through index_bytes().
+        """
+        header = {"ids": self.ids, "agents": self.agents, "dependencies": self.dependencies}
+        parts = [json.dumps(header, separators=(",", ":")).encode()]
+        body = struct.pack(f"<I{len(parts)}Q", len(parts), *(len(p) for p in parts)) + b"".join(parts)
+        return GRAPH_FORMAT_MAGIC + zlib.compress(body, 1)
+
+    def index_bytes(self, name: str) -> bytes:
+        """One built index, compressed: SCC assignment as int32s, or cached JSON"""
+        if name == "components":
+            data = array("i", self.components[0]).tobytes()
+        else:
+            data = json.dumps(self._cache[name], separators=(",", ":")).encode()
+        return zlib.compress(data, 1)
+
+    def restore_index(self, name: str, data: bytes) -> None:
+        """Inverse of index_bytes; unknown names are ignored"""
+        if name == "components":
+            comp_of = array("i")
+            comp_of.frombytes(zlib.decompress(data))
+            self._restore_components(comp_of)
+        elif name in PERSISTED_INDEXES:
+            data = zlib.decompress(data)
+            self._cache_bytes[name] = 2 * len(data)
+            self._cache[name] = json.loads(data)
+
+    def _restore_components(self, comp_of: array) -> None:
+        components: List[List[int]] = [[] for _ in range(max(comp_of, default=-1) + 1)]
+        for node, comp in enumerate(comp_of):
+            components[comp].append(node)
+        self._components = (comp_of.tolist(), components)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, indexes: Optional[Dict[str, bytes]] = None) -> "AgentGraph":
+        """
+        Inverse of to_bytes, plus any indexes from index_bytes(), which are
+        used instead of recomputed
+        """
+        if blob[:4] != GRAPH_FORMAT_MAGIC:
+            raise ValueError("Not a serialized AgentGraph")
+        body = zlib.decompress(blob[4:])
+        (count,) = struct.unpack_from("<I", body)
+        sizes = struct.unpack_from(f"<{count}Q", body, 4)
+        offset = 4 + 8 * count
+        header = json.loads(body[offset:offset + sizes[0]])
+        graph = cls(header["agents"], header["dependencies"], header["ids"])
+        for name, data in (indexes or {}).items():
+            graph.restore_index(name, data)
+        return graph
+
+    def with_changes(
+        self,
+        upsert_agents: List[Dict[str, Any]] = (),
+        remove_agents: List[str] = (),
+        upsert_dependencies: List[Dict[str, Any]] = (),
+        remove_dependencies: List[Dict[str, Any]] = ()
+    ) -> Tuple["AgentGraph", Dict[str, Any]]:
+        """
+        New graph with agents and dependency edges added, updated or
+        removed, built from this one without a full rebuild.
+
+        Adjacency lists are shared and copied only where they change. If
+        SCCs and the closure were built, they are carried over: only nodes
+        that can reach the source of a changed edge (the affected ancestors)
+        get their components re-run through Tarjan and their reach sets
+        recomputed; every other component keeps its bitset. Node ids are
+        never reused, so a removed agent stays behind as an isolated node.
+        Dependencies are matched on (source, target, type); removals
+        without a type remove every edge between the pair. Removed edges
+        are swap-removed, so dependency order is not preserved.
+        The new content_hash chains this one with the effective changes,
+        so it costs O(changes) rather than a hash of the whole graph.
+        Returns (graph, stats).
+        """
+        started = time.perf_counter()
+        g = AgentGraph.__new__(AgentGraph)
+        g.ids = list(self.ids)
+        g.index = dict(self.index)
+        g.agents_by_id = dict(self.agents_by_id)
+        g.dependencies = list(self.dependencies)
+        g.edge_sources = list(self.edge_sources)
+        g.edge_targets = list(self.edge_targets)
+        g.successors = list(self.successors)
+        g.predecessors = list(self.predecessors)
+        g.out_edges = list(self.out_edges)
+        g.in_edges = list(self.in_edges)
+        g._components = None
+        g._closure = None
+        g._cache = {}
+        g._cache_bytes = {}
+
+        old_count = len(g.ids)
+        owned = set()
+
+        def own(v: int) -> None:
+            # Copy-on-write for the adjacency lists of node v
+            if v not in owned and v < old_count:
+                g.successors[v] = list(g.successors[v])
+                g.predecessors[v] = list(g.predecessors[v])
+                g.out_edges[v] = list(g.out_edges[v])
+                g.in_edges[v] = list(g.in_edges[v])
+                owned.add(v)
+
+        def intern(node_id: str) -> int:
+            v = g.index.get(node_id)
+            if v is None:
+                v = g._intern(node_id)
+                for adjacency in (g.successors, g.predecessors, g.out_edges, g.in_edges):
+                    adjacency.append([])
+            return v
+
+        touched: set = set()
+        removed_edges: set = set()
+
+        # Agents
+        removed_ids = {a for a in remove_agents if a in g.agents_by_id}
+        for agent_id in removed_ids:
+            del g.agents_by_id[agent_id]
+            v = g.index[agent_id]
+            removed_edges.update(g.out_edges[v])
+            removed_edges.update(g.in_edges[v])
+        new_agents = []
+        changed_agents = [a for a in upsert_agents if g.agents_by_id.get(a["id"]) != a]
+        for agent in upsert_agents:
+            if agent["id"] not in g.agents_by_id:
+                new_agents.append(agent)
+            g.agents_by_id[agent["id"]] = agent
+            intern(agent["id"])
+        g.agents = [g.agents_by_id[a["id"]] for a in self.agents if a["id"] in g.agents_by_id] + new_agents
+
+        # Edge removals
+        for dep in remove_dependencies:
+            s, t = g.index.get(dep["source"]), g.index.get(dep["target"])
+            if s is None or t is None:
+                continue
+            for e in g.out_edges[s]:
+                if g.edge_targets[e] == t and dep.get("type") in (None, g.dependencies[e]["type"]):
+                    removed_edges.add(e)
+
+        # Edge upserts: metadata updates in place, new edges appended
+        added = updated = 0
+        changed_dependencies = []
+        redundant: List[Tuple[int, int]] = []
+        for dep in upsert_dependencies:
+            s, t = intern(dep["source"]), intern(dep["target"])
+            existing = next(
+                (e for e in g.out_edges[s]
+                 if g.edge_targets[e] == t and g.dependencies[e]["type"] == dep["type"] and e not in removed_edges),
+                None
+            )
+            if existing is not None:
+                if g.dependencies[existing] != dep:
+                    changed_dependencies.append(dep)
+                g.dependencies[existing] = dep
+                updated += 1
+                continue
+            own(s)
+            own(t)
+            e = len(g.dependencies)
+            g.dependencies.append(dep)
+            g.edge_sources.append(s)
+            g.edge_targets.append(t)
+            g.successors[s].append(t)
+            g.predecessors[t].append(s)
+            g.out_edges[s].append(e)
+            g.in_edges[t].append(e)
+            redundant.append((s, t))
+            changed_dependencies.append(dep)
+            added += 1
+
+        change_set = [
+            changed_agents,
+            sorted(removed_ids),
+            changed_dependencies,
+            [g.dependencies[e] for e in sorted(removed_edges)]
+        ]
+        if any(change_set):
+            digest = hashlib.blake2b(self.content_hash.encode(), digest_size=16)
+            digest.update(json.dumps(change_set, sort_keys=True, separators=(",", ":")).encode())
+            g._cache["content_hash"] = digest.hexdigest()
+        else:
+            g._cache["content_hash"] = self.content_hash
+
+        # Swap-remove, highest position first, so the edge moved into a
+        # freed slot is never one still waiting to be removed
+        for e in sorted(removed_edges, reverse=True):
+            s, t = g.edge_sources[e], g.edge_targets[e]
+            own(s)
+            own(t)
+            g.successors[s].remove(t)
+            g.predecessors[t].remove(s)
+            g.out_edges[s].remove(e)
+            g.in_edges[t].remove(e)
+            touched.add(s)
+            last = len(g.dependencies) - 1
+            if e != last:
+                ls, lt = g.edge_sources[last], g.edge_targets[last]
+                own(ls)
+                own(lt)
+                g.dependencies[e] = g.dependencies[last]
+                g.edge_sources[e], g.edge_targets[e] = ls, lt
+                g.out_edges[ls][g.out_edges[ls].index(last)] = e
+                g.in_edges[lt][g.in_edges[lt].index(last)] = e
+            g.dependencies.pop()
+            g.edge_sources.pop()
+            g.edge_targets.pop()
+
+        # A new edge u->v changes no SCC or reach set if u could already
+        # reach v. That is only known for sure when nothing was removed.
+        for s, t in redundant:
+            if removed_edges or not self._already_reaches(s, t):
+                touched.add(s)
+
+        if not (new_agents or removed_ids or added or removed_edges):
+            # Agent or edge metadata only: ids and edges, so the topology
+            # hash and layout, are unchanged
+            for key in ("topology_hash", "layout"):
+                if key in self._cache:
+                    g._cache[key] = self._cache[key]
+                    g._cache_bytes[key] = self._cache_bytes.get(key, 0)
+
+        new_nodes = list(range(old_count, len(g.ids)))
+        affected = self._carry_indexes(g, touched, new_nodes)
+        stats = {
+            "agents_added": len(new_agents),
+            "agents_updated": len(upsert_agents) - len(new_agents),
+            "agents_removed": len(removed_ids),
+            "dependencies_added": added,
+            "dependencies_updated": updated,
+            "dependencies_removed": len(removed_edges),
+            "affected_nodes": affected,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        return g, stats
+
+    def _already_reaches(self, s: int, t: int) -> bool:
+        """True if node s reached node t in this graph (per the built indexes)"""
+        if s >= self.node_count or t >= self.node_count or self._components is None:
+            return False
+        comp_of = self._components[0]
+        if comp_of[s] == comp_of[t]:
+            return True
+        if self._closure is None:
+            return False
+        row = self._closure.cached_row(comp_of[s])
+        return row is not None and bool(row >> t & 1)
+
+    def _carry_indexes(self, g: "AgentGraph", touched: set, new_nodes: List[int]) -> int:
+        """
+        Carry this graph's SCCs and closure over to g, recomputing only the
+        nodes that can reach a touched edge source (plus new nodes). No edge
+        enters that set from outside it, so its components can be renumbered
+        after all the untouched ones and reverse topological order holds.
+        Returns the number of affected nodes.
+        """
+        if self._components is None:
+            return 0
+
+        seeds = touched.union(new_nodes)
+        if not seeds:
+            # Agent or edge metadata only: the indexes are unchanged
+            g._components = self._components
+            if self._closure is not None:
+                g._closure = ClosureCache(g, self._closure.rows())
+            return 0
+
+        # Affected ancestors: reverse BFS over g from touched sources
+        affected = bytearray(len(g.ids))
+        queue = deque(seeds)
+        for v in seeds:
+            affected[v] = 1
+        predecessors = g.predecessors
+        while queue:
+            v = queue.popleft()
+            for w in predecessors[v]:
+                if not affected[w]:
+                    affected[w] = 1
+                    queue.append(w)
+
+        region = [v for v in range(len(g.ids)) if affected[v]]
+        if len(region) > len(g.ids) * FULL_RECOMPUTE_FRACTION:
+            # Most of the graph is affected: a plain rebuild is cheaper
+            g._components = strongly_connected_components(g.successors)
+            if self._closure is not None:
+                g._closure = ClosureCache(g)
+            return len(region)
+
+        old_comp_of, old_components = self._components
+        closure = self._closure
+        # With every row held, affected rows are rebuilt here from their
+        # descendants; otherwise they are left to be computed on first use
+        complete = closure is not None and closure.complete
+        comp_of = old_comp_of + [-1] * len(new_nodes)
+        components: List[List[int]] = []
+        reach: Dict[int, int] = {}
+        for comp, members in enumerate(old_components):
+            if affected[members[0]]:
+                continue
+            new_comp = len(components)
+            for v in members:
+                comp_of[v] = new_comp
+            components.append(members)
+            if closure is not None:
+                row = closure.cached_row(comp)
+                if row is not None:
+                    reach[new_comp] = row
+
+        # Tarjan over the affected subgraph only
+        local = {v: i for i, v in enumerate(region)}
+        local_successors = [[local[w] for w in g.successors[v] if w in local] for v in region]
+        _, local_components = strongly_connected_components(local_successors)
+        successors = g.successors
+        for members_local in local_components:
+            members = [region[i] for i in members_local]
+            comp = len(components)
+            for v in members:
+                comp_of[v] = comp
+            components.append(members)
+            if complete:
+                reach[comp] = component_reach(members, comp, comp_of, successors, reach)
+
+        g._components = (comp_of, components)
+        if closure is not None:
+            g._closure = ClosureCache(g, reach)
+        return len(region)
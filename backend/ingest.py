@@ -0,0 +1,121 @@
+"""
+Streaming Ingest for AgentGuard
+NDJSON agent inventories of any size, read incrementally:
+- One record per line: {"kind": "agent", ...} or {"kind": "dependency", ...}
+- Records are validated and interned as they arrive; only a partial line is buffered
+- Progress counters can be read while the upload is still running
+"""
+
+import json
+import time
+from typing import AsyncIterator, Dict, List, Any, Optional
+
+from graph_engine import AgentGraph, GraphBuilder
+
+# Longest accepted NDJSON line; anything longer is rejected, not buffered
+INGEST_MAX_LINE_BYTES = 1024 * 1024
+
+# Invalid records are skipped; the first few are reported back
+INGEST_MAX_REPORTED_ERRORS = 50
+
+AGENT_REQUIRED_FIELDS = ("id", "name", "type", "risk")
+
+
+class IngestError(Exception):
+    """The stream cannot be ingested at all (as opposed to a bad record)"""
+
+
+class NDJSONIngest:
+    """One streamed upload: parses chunks into a GraphBuilder, tracking progress"""
+
+    def __init__(self):
+        self.builder = GraphBuilder()
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.status = "running"
+        self.bytes_read = 0
+        self.lines = 0
+        self.agents = 0
+        self.dependencies = 0
+        self.invalid = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    async def consume(self, chunks: AsyncIterator[bytes]) -> AgentGraph:
+        """Read the whole stream and return the new graph, built once at the end"""
+        pending = b""
+        try:
+            async for chunk in chunks:
+                self.bytes_read += len(chunk)
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    self._line(line)
+                if len(pending) > INGEST_MAX_LINE_BYTES:
+                    raise IngestError(f"Line {self.lines + 1} exceeds {INGEST_MAX_LINE_BYTES} bytes")
+            self._line(pending)
+
+            if not self.builder.agents_by_id:
+                raise IngestError("No valid agent records in the stream")
+            graph = AgentGraph.from_builder(self.builder)
+        except Exception:
+            self.status = "failed"
+            self.finished_at = time.time()
+            raise
+        self.status = "complete"
+        self.finished_at = time.time()
+        return graph
+
+    def _line(self, line: bytes) -> None:
+        self.lines += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("record is not a JSON object")
+            kind = record.pop("kind", None)
+            if kind == "agent":
+                self.builder.add_agent(_agent(record))
+                self.agents += 1
+            elif kind == "dependency":
+                self.builder.add_dependency(_dependency(record))
+                self.dependencies += 1
+            else:
+                raise ValueError(f"unknown kind {kind!r}; expected 'agent' or 'dependency'")
+        except ValueError as e:
+            self.invalid += 1
+            if len(self.errors) < INGEST_MAX_REPORTED_ERRORS:
+                self.errors.append({"line": self.lines, "error": str(e)})
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "status": self.status,
+            "bytes_read": self.bytes_read,
+            "lines": self.lines,
+            "agents": self.agents,
+            "dependencies": self.dependencies,
+            "invalid_records": self.invalid,
+            "errors": self.errors,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "records_per_sec": round((self.agents + self.dependencies) / elapsed) if elapsed > 0 else None
+        }
+
+
+def _agent(record: Dict[str, Any]) -> Dict[str, Any]:
+    for field in AGENT_REQUIRED_FIELDS:
+        if not isinstance(record.get(field), str) or not record[field]:
+            raise ValueError(f"agent needs a non-empty string '{field}'")
+    return record
+
+
+def _dependency(record: Dict[str, Any]) -> Dict[str, Any]:
+    for field in ("source", "target"):
+        if not isinstance(record.get(field), str) or not record[field]:
+            raise ValueError(f"dependency needs a non-empty string '{field}'")
+    record.setdefault("type", "api_call")
+    confidence = record.setdefault("confidence", 0.9)
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0.0 <= confidence <= 1.0:
+        raise ValueError("dependency 'confidence' must be a number between 0 and 1")
+    return record
@@ -1,17 +1,91 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from startup_profile import startup_profile
+
+with startup_profile.step("import fastapi"):
+    from fastapi import FastAPI, HTTPException, Request, Response, Depends, Header
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel, ConfigDict, Field
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, Union, Literal
+import asyncio
 import json
 import random
+import time
 from datetime import datetime
-from gemini_service import gemini_service
-from demo_datasets import get_dataset
+with startup_profile.step("import gemini_service"):
+    from gemini_service import gemini_service
+with startup_profile.step("import demo_datasets"):
+    from demo_datasets import get_dataset, synthetic_graph
+with startup_profile.step("import graph modules"):
+    from graph_engine import AgentGraph
+    from workspaces import Workspace, workspace_store, encode_response
+    from ingest import NDJSONIngest, IngestError
+    from trace_scanner import TraceScanError, trace_files, scan_traces
+    from shared_store import shared_store
+    from graph_analysis import (
+        single_points_of_failure,
+        circular_dependencies,
+        risk_assessment,
+        hierarchical_layout,
+    )
+    from simulator import (
+        blast_radius_score,
+        batch_impacted_counts,
+        impact_estimate,
+        simulate_batch,
+        simulate_multi,
+        worst_case_failure_set,
+        monte_carlo_cascade,
+    )
+
+DEFAULT_DEMO_TYPE = "ecommerce"
+
+# Graphs built ahead of time by the lifespan hook, handed to the first
+# scan of their dataset (later scans build their own)
+_prebuilt_graphs: Dict[str, AgentGraph] = {}
+
+async def _warm_up_gemini():
+    """Import the Gemini SDK in a worker thread so the first request doesn't pay for it"""
+    if not gemini_service.is_available():
+        return
+    await asyncio.to_thread(gemini_service.load_model)
+    startup_profile.record("load Gemini SDK", gemini_service.load_ms or 0.0, background=True)
+
+async def _preload_latest_snapshot():
+    """Deserialize the newest stored snapshot so the first request after a restart is fast"""
+    started = time.perf_counter()
+    if await workspace_store.preload_latest_snapshot():
+        startup_profile.record("load latest snapshot", (time.perf_counter() - started) * 1000, background=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the default dataset's indexes before serving; warm up Gemini and
+    load the latest stored snapshot in the background
+    """
+    with startup_profile.step("build default dataset indexes"):
+        dataset = get_dataset(DEFAULT_DEMO_TYPE)
+        graph = AgentGraph(dataset["agents"], dataset["dependencies"])
+        graph.closure
+        graph.content_hash
+        graph.cached("graph_data", lambda: _build_graph_data(graph))
+        _prebuilt_graphs[DEFAULT_DEMO_TYPE] = graph
+    
+    warm_up = asyncio.create_task(_warm_up_gemini())
+    preload = asyncio.create_task(_preload_latest_snapshot())
+    startup_profile.mark_ready()
+    startup_profile.log()
+    
+    yield
+    
+    warm_up.cancel()
+    preload.cancel()
 
 app = FastAPI(
     title="AgentGuard API",
     description="Multi-Agent Reliability Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -22,21 +96,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for demo
-app_state = {
-    "agents": [],
-    "dependencies": [],
-    "graph_data": None,
-    "simulation_result": None,
-    "playbook": None
-}
+async def current_workspace(x_workspace_id: Optional[str] = Header(None)):
+    """
+    In-memory state for the caller's X-Workspace-Id (or the default
+    workspace), so concurrent teams don't overwrite each other's scans.
+    Changes are written to the shared store and memory limits enforced
+    once the request is done with it.
+    """
+    try:
+        workspace = await workspace_store.get(x_workspace_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    yield workspace
+    await workspace_store.commit(workspace)
+    workspace_store.enforce_limits(keep=workspace)
 
 class ScanRequest(BaseModel):
     demo_type: Optional[str] = "ecommerce"
+    snapshot_id: Optional[str] = None
+    # With demo_type "otel": OTLP/JSON files under AGENTGUARD_TRACE_DIR to scan
+    trace_glob: Optional[str] = "*.json*"
+
+class AgentRecord(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    
+    id: str
+    name: str
+    type: str
+    risk: str
+
+class DependencyRecord(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    
+    source: str
+    target: str
+    type: str = "api_call"
+    confidence: float = Field(0.9, ge=0.0, le=1.0)
+
+class DependencyRef(BaseModel):
+    source: str
+    target: str
+    type: Optional[str] = None
+
+class TopologyPatchRequest(BaseModel):
+    upsert_agents: List[AgentRecord] = []
+    remove_agents: List[str] = []
+    upsert_dependencies: List[DependencyRecord] = []
+    remove_dependencies: List[DependencyRef] = []
 
 class SimulateRequest(BaseModel):
     agent_id: str
 
+class BatchSimulateRequest(BaseModel):
+    agent_ids: Union[List[str], Literal["all"]] = "all"
+
+class MultiSimulateRequest(BaseModel):
+    agent_ids: List[str] = Field(..., min_length=1)
+
+class WorstCaseRequest(BaseModel):
+    k: int = Field(3, ge=1, le=50)
+
+class RiskExplainRequest(BaseModel):
+    agent_ids: Optional[List[str]] = None
+    min_risk_score: float = 0.0
+    spof_only: bool = False
+
+class EvidenceBatchRequest(BaseModel):
+    group_by: Literal["source", "type"] = "source"
+    sources: Optional[List[str]] = None
+
+class MonteCarloRequest(BaseModel):
+    agent_ids: List[str] = Field(..., min_length=1)
+    trials: int = Field(2000, ge=1, le=50000)
+    seed: Optional[int] = None
+    time_budget_ms: int = Field(2000, ge=10, le=30000)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+def _versioned_json(request: Request, etag: str, body: bytes) -> Response:
+    """JSON response with an ETag, or an empty 304 if the client is current"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/")
 async def root():
     return {
@@ -50,18 +199,88 @@ async def health():
     return {"status": "healthy"}
 
 @app.post("/api/scan")
-async def scan_agents(request: ScanRequest):
+async def scan_agents(request: ScanRequest, workspace: Workspace = Depends(current_workspace)):
     """Scan and discover AI agents in the system"""
     
-    # Load dataset based on demo type
-    dataset = get_dataset(request.demo_type)
-    agents = dataset["agents"]
-    dependencies = dataset["dependencies"]
+    state = workspace.state
+    
+    demo_type = request.demo_type
+    trace_stats = None
+    prepared = None
+    if request.snapshot_id:
+        # Reuse a stored scan and its derived indexes instead of re-ingesting
+        snapshot = None
+        if shared_store.enabled:
+            snapshot = await asyncio.to_thread(shared_store.snapshot, request.snapshot_id, workspace.id)
+        graph = await workspace_store.load_snapshot(request.snapshot_id) if snapshot else None
+        if graph is None:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        demo_type = snapshot["demo_type"]
+    elif demo_type == "otel":
+        # Derive the topology from trace files on disk, off the event loop
+        try:
+            paths = trace_files(request.trace_glob or "*.json*")
+            if not paths:
+                raise TraceScanError("No trace files found")
+            dataset, trace_stats = await asyncio.to_thread(scan_traces, paths)
+        except TraceScanError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        graph = AgentGraph(dataset["agents"], dataset["dependencies"])
+    elif demo_type and demo_type.startswith("synthetic"):
+        # Large generated topologies are built, hashed and encoded off the
+        # event loop
+        try:
+            graph, *prepared = await asyncio.to_thread(_synthetic_scan, demo_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        # Load dataset based on demo type, reusing the index built at startup
+        graph = _prebuilt_graphs.pop(demo_type, None)
+        if graph is None:
+            dataset = get_dataset(demo_type)
+            graph = AgentGraph(dataset["agents"], dataset["dependencies"])
+    agents = graph.agents
+    dependencies = graph.dependencies
+    
+    # Store in state and build the graph index once per scan
+    state["agents"] = agents
+    state["dependencies"] = dependencies
+    state["graph"] = graph
+    state["graph_data"] = None
+    
+    # Pre-generate playbooks for the highest blast-radius agents
+    workspace.prewarmer.start(graph)
+    
+    if prepared is None:
+        prepared = _prepared_scan(graph, demo_type, trace_stats)
+    scan_result, (etag, body) = prepared
     
-    # Store in state
-    app_state["agents"] = agents
-    app_state["dependencies"] = dependencies
+    # Encoded once here and reused by GET /api/scan, which shares the ETag
+    workspace.store_encoded("scan_result", scan_result, (etag, body))
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def _synthetic_scan(demo_type: str) -> Tuple[AgentGraph, Dict[str, Any], Tuple[str, bytes]]:
+    """Synthetic graph, its scan response and the encoded response, in one worker call"""
+    
+    graph = synthetic_graph(demo_type)
+    return (graph, *_prepared_scan(graph, demo_type))
+
+def _prepared_scan(
+    graph: AgentGraph,
+    demo_type: Optional[str],
+    trace_stats: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], Tuple[str, bytes]]:
+    """Scan response for a graph and its encoded (ETag, body)"""
     
+    scan_result = _scan_result(graph, demo_type)
+    if trace_stats is not None:
+        scan_result["trace_scan"] = trace_stats
+    return scan_result, encode_response(scan_result)
+
+def _scan_result(graph: AgentGraph, demo_type: Optional[str]) -> Dict[str, Any]:
+    """Scan response for a graph: agents, dependencies and summary metrics"""
+    
+    agents = graph.agents
     shadow_agents = [a for a in agents if a["type"] == "shadow_agent"]
     
     return {
@@ -70,22 +289,146 @@ async def scan_agents(request: ScanRequest):
         "total_shadow_agents": len(shadow_agents),
         "agents": agents,
         "shadow_agents": shadow_agents,
-        "dependencies": dependencies,
+        "dependencies": graph.dependencies,
         "scan_time": datetime.now().isoformat(),
-        "demo_type": request.demo_type,
+        "demo_type": demo_type,
         "metrics": {
             "total_requests_per_min": sum(a.get("requests_per_min", 0) for a in agents),
-            "avg_uptime": f"{sum(float(a.get('uptime', '0%').rstrip('%')) for a in agents) / len(agents):.1f}%",
+            "avg_uptime": f"{sum(float(a.get('uptime', '0%').rstrip('%')) for a in agents) / max(len(agents), 1):.1f}%",
             "critical_agents": len([a for a in agents if a["risk"] == "critical"]),
             "high_risk_agents": len([a for a in agents if a["risk"] == "high"])
         },
-        "gemini_available": gemini_service.is_available()
+        "gemini_available": gemini_service.is_available(),
+        "version": graph.content_hash
+    }
+
+@app.post("/api/ingest")
+async def ingest_topology(request: Request, workspace: Workspace = Depends(current_workspace)):
+    """
+    Load a real inventory as NDJSON, one {"kind": "agent" | "dependency", ...}
+    record per line. The body is parsed as it streams in; the current
+    topology stays in place until the whole stream is ingested, then is
+    swapped for the new one in a single step.
+    """
+    
+    state = workspace.state
+    
+    if workspace.ingest is not None and workspace.ingest.status == "running":
+        raise HTTPException(status_code=409, detail="An ingest is already running in this workspace")
+    
+    ingest = NDJSONIngest()
+    workspace.ingest = ingest
+    try:
+        graph = await ingest.consume(request.stream())
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Atomic swap: nothing awaits between these assignments
+    state["agents"] = graph.agents
+    state["dependencies"] = graph.dependencies
+    state["graph"] = graph
+    state["graph_data"] = None
+    state["scan_result"] = _scan_result(graph, "ingest")
+    workspace.prewarmer.start(graph)
+    
+    return {
+        "success": True,
+        "version": graph.content_hash,
+        "total_agents": graph.agent_count,
+        "total_dependencies": len(graph.dependencies),
+        **ingest.progress()
     }
 
+@app.get("/api/ingest/progress")
+async def ingest_progress(workspace: Workspace = Depends(current_workspace)):
+    """Counters for the running (or last) ingest in this workspace"""
+    
+    if workspace.ingest is None:
+        raise HTTPException(status_code=404, detail="No ingest started in this workspace")
+    
+    return workspace.ingest.progress()
+
+@app.patch("/api/topology")
+async def patch_topology(request: TopologyPatchRequest, workspace: Workspace = Depends(current_workspace)):
+    """
+    Add, update or remove individual agents and dependency edges without a
+    re-scan. The graph's SCCs and blast-radius cache are carried forward,
+    recomputing only the ancestors of changed edges. The scan response is
+    rebuilt in a worker thread and only encoded by the next GET /api/scan.
+    """
+    
+    state = workspace.state
+    
+    graph = state["graph"]
+    if graph is None:
+        raise HTTPException(status_code=400, detail="No agents scanned yet")
+    
+    previous_version = graph.content_hash
+    graph, stats = graph.with_changes(
+        upsert_agents=[a.model_dump() for a in request.upsert_agents],
+        remove_agents=request.remove_agents,
+        upsert_dependencies=[d.model_dump() for d in request.upsert_dependencies],
+        remove_dependencies=[d.model_dump(exclude_none=True) for d in request.remove_dependencies]
+    )
+    
+    demo_type = (state["scan_result"] or {}).get("demo_type")
+    
+    # Swap the graph in before awaiting, so a concurrent PATCH builds on it
+    state["agents"] = graph.agents
+    state["dependencies"] = graph.dependencies
+    state["graph"] = graph
+    state["graph_data"] = None
+    if graph.content_hash != previous_version:
+        # The last simulation and playbook describe the old topology
+        state["simulation_result"] = None
+        state["playbook"] = None
+        workspace.prewarmer.start(graph)
+    
+    scan_result = await asyncio.to_thread(_scan_result, graph, demo_type)
+    if state["graph"] is graph:
+        state["scan_result"] = scan_result
+    
+    return {
+        "success": True,
+        "version": graph.content_hash,
+        "total_agents": graph.agent_count,
+        "total_dependencies": len(graph.dependencies),
+        **stats
+    }
+
+@app.get("/api/snapshots")
+async def list_snapshots(limit: int = 50, workspace: Workspace = Depends(current_workspace)):
+    """
+    Stored snapshots of the scans this workspace has run, newest first;
+    pass an id to /api/scan as snapshot_id
+    """
+    
+    if not shared_store.enabled:
+        return {"enabled": False, "snapshots": []}
+    
+    snapshots = await asyncio.to_thread(shared_store.list_snapshots, max(1, min(limit, 500)), workspace.id)
+    return {"enabled": True, "snapshots": snapshots}
+
+@app.get("/api/scan")
+async def get_scan(request: Request, workspace: Workspace = Depends(current_workspace)):
+    """Latest scan result; supports If-None-Match for cheap polling"""
+    
+    state = workspace.state
+    
+    graph = state["graph"]
+    if graph is None or state["scan_result"] is None:
+        raise HTTPException(status_code=400, detail="No agents scanned yet")
+    
+    etag, body = workspace.encoded("scan_result")
+    return _versioned_json(request, etag, body)
+
 # Legacy code below - will be removed
 @app.post("/api/scan_old")
-async def scan_agents_old(request: ScanRequest):
+async def scan_agents_old(request: ScanRequest, workspace: Workspace = Depends(current_workspace)):
     """Old scan endpoint - deprecated"""
+    
+    state = workspace.state
+    
     agents_old = [
         {
             "id": "pricing-agent", 
@@ -412,9 +755,11 @@ async def scan_agents_old(request: ScanRequest):
     
     shadow_agents = [a for a in agents if a["type"] == "shadow_agent"]
     
-    # Store in state
-    app_state["agents"] = agents
-    app_state["dependencies"] = dependencies
+    # Store in state and build the graph index once per scan
+    state["agents"] = agents
+    state["dependencies"] = dependencies
+    state["graph"] = AgentGraph(agents, dependencies)
+    workspace.prewarmer.start(state["graph"])
     
     return {
         "success": True,
@@ -433,53 +778,41 @@ async def scan_agents_old(request: ScanRequest):
     }
 
 @app.get("/api/graph")
-async def get_graph():
+async def get_graph(request: Request, workspace: Workspace = Depends(current_workspace)):
     """Get dependency graph with risk analysis"""
     
-    if not app_state["agents"]:
+    state = workspace.state
+    
+    graph = state["graph"]
+    if graph is None or not graph.agents:
         raise HTTPException(status_code=400, detail="No agents scanned yet")
     
-    # Build graph nodes with organized hierarchical layout
-    # Layer-based positioning for clean visualization
-    layout = {
-        # Top layer: Entry points (user-facing)
-        "search-agent": {"x": 100, "y": 50},
-        "cart-agent": {"x": 300, "y": 50},
-        "checkout-agent": {"x": 500, "y": 50},
-        "customer-support-agent": {"x": 700, "y": 50},
-        "review-agent": {"x": 900, "y": 50},
-        
-        # Second layer: Core business logic
-        "pricing-agent": {"x": 150, "y": 200},
-        "inventory-agent": {"x": 350, "y": 200},
-        "payment-agent": {"x": 550, "y": 200},
-        "order-agent": {"x": 750, "y": 200},
-        "recommendation-agent": {"x": 950, "y": 200},
-        
-        # Third layer: Supporting services
-        "fraud-detection-agent": {"x": 100, "y": 350},
-        "tax-agent": {"x": 300, "y": 350},
-        "shipping-agent": {"x": 500, "y": 350},
-        "notification-agent": {"x": 700, "y": 350},
-        "analytics-agent": {"x": 900, "y": 350},
-        
-        # Fourth layer: Backend integrations
-        "warehouse-agent": {"x": 150, "y": 500},
-        "supplier-agent": {"x": 350, "y": 500},
-        "email-agent": {"x": 550, "y": 500},
-        "loyalty-agent": {"x": 750, "y": 500},
-        "returns-agent": {"x": 950, "y": 500},
-        
-        # Bottom layer: Shadow agents (legacy)
-        "legacy-pricing-v1": {"x": 200, "y": 650},
-        "old-inventory-sync": {"x": 400, "y": 650},
-        "deprecated-payment-gateway": {"x": 600, "y": 650},
-        "manual-override-bot": {"x": 800, "y": 650},
-    }
+    # The payload only depends on the scan, so it is built once per scan and
+    # encoded once per workspace, both in a worker thread; the ETag is a hash
+    # of the encoded body
+    if state["graph_data"] is None:
+        graph_data, (etag, body) = await asyncio.to_thread(_encoded_graph_data, graph)
+        if state["graph"] is graph:
+            workspace.store_encoded("graph_data", graph_data, (etag, body))
+    else:
+        etag, body = workspace.encoded("graph_data")
+    return _versioned_json(request, etag, body)
+
+def _encoded_graph_data(graph: AgentGraph) -> Tuple[Dict[str, Any], Tuple[str, bytes]]:
+    """Graph payload of a scan, cached on the graph, and its encoded (ETag, body)"""
+    
+    graph_data = graph.cached("graph_data", lambda: _build_graph_data(graph))
+    return graph_data, encode_response(graph_data)
+
+def _build_graph_data(graph: AgentGraph) -> Dict[str, Any]:
+    """Nodes, edges and topology analysis for one scan"""
+    
+    # Layered layout computed once per topology
+    layout = hierarchical_layout(graph)
     
     nodes = []
-    for agent in app_state["agents"]:
-        position = layout.get(agent["id"], {"x": random.randint(100, 900), "y": random.randint(100, 600)})
+    for agent in graph.agents:
+        position = layout[agent["id"]]
         nodes.append({
             "id": agent["id"],
             "data": {
@@ -495,7 +828,7 @@ async def get_graph():
     
     # Build graph edges
     edges = []
-    for idx, dep in enumerate(app_state["dependencies"]):
+    for idx, dep in enumerate(graph.dependencies):
         edges.append({
             "id": f"e{idx}",
             "source": dep["source"],
@@ -508,75 +841,47 @@ async def get_graph():
         })
     
     # Calculate risk metrics
-    spof_agents = ["pricing-agent", "payment-agent", "checkout-agent", "order-agent"]
-    circular_deps = [
-        ["cart-agent", "pricing-agent", "inventory-agent", "cart-agent"]
-    ]
+    spofs = single_points_of_failure(graph)
+    cycles = circular_dependencies(graph)
     
-    risk_scores = {}
-    for agent in app_state["agents"]:
-        if agent["risk"] == "high":
-            risk_scores[agent["id"]] = random.uniform(7.5, 9.5)
-        elif agent["risk"] == "medium":
-            risk_scores[agent["id"]] = random.uniform(4.5, 7.0)
-        else:
-            risk_scores[agent["id"]] = random.uniform(1.0, 4.0)
+    risk = risk_assessment(graph)
     
-    overall_risk = 8.5
-    
-    graph_data = {
+    return {
         "nodes": nodes,
         "edges": edges,
         "analysis": {
-            "spof_agents": spof_agents,
-            "circular_dependencies": circular_deps,
-            "risk_scores": risk_scores,
-            "overall_risk": overall_risk
+            "spof_agents": spofs["spof_agents"],
+            "spof_details": spofs["spof_details"],
+            "circular_dependencies": cycles["circular_dependencies"],
+            "cyclic_components": cycles["cyclic_components"],
+            "risk_scores": risk["risk_scores"],
+            "overall_risk": risk["overall_risk"]
         }
     }
-    
-    app_state["graph_data"] = graph_data
-    
-    return graph_data
 
 @app.post("/api/simulate")
-async def simulate_failure(request: SimulateRequest):
+async def simulate_failure(request: SimulateRequest, workspace: Workspace = Depends(current_workspace)):
     """Simulate agent failure and calculate blast radius"""
     
-    if not app_state["dependencies"]:
+    state = workspace.state
+    
+    graph = state["graph"]
+    if graph is None or not graph.dependencies:
         raise HTTPException(status_code=400, detail="No graph data available")
     
     agent_id = request.agent_id
     
     # Find agent
-    agent = next((a for a in app_state["agents"] if a["id"] == agent_id), None)
+    agent = graph.get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    # BFS to find impacted agents
-    impacted = set()
-    visited = {agent_id}
-    queue = [agent_id]
-    
-    while queue:
-        current = queue.pop(0)
-        for dep in app_state["dependencies"]:
-            if dep["source"] == current and dep["target"] not in visited:
-                visited.add(dep["target"])
-                impacted.add(dep["target"])
-                queue.append(dep["target"])
-    
-    # Get impacted agent details
-    impacted_agents = [
-        next((a for a in app_state["agents"] if a["id"] == aid), None)
-        for aid in impacted
-    ]
-    impacted_agents = [a for a in impacted_agents if a]
+    # Impacted agents come from the per-scan transitive-closure cache
+    impacted = graph.closure.reachable(agent_id)
+    impacted_agents = graph.agents_for(impacted)
     
     # Calculate blast radius score
-    total_agents = len(app_state["agents"])
-    impact_ratio = len(impacted) / total_agents if total_agents > 0 else 0
-    blast_radius_score = min(impact_ratio * 15, 10)
+    score = blast_radius_score(len(impacted), graph.agent_count)
     
     # Identify impacted workflows
     workflows = []
@@ -592,15 +897,7 @@ async def simulate_failure(request: SimulateRequest):
         workflows.append("Payment Processing")
     
     # Estimate impact
-    if len(impacted) > 10:
-        severity = "CRITICAL"
-        revenue_risk = "$500K-2M/hour"
-    elif len(impacted) > 5:
-        severity = "HIGH"
-        revenue_risk = "$100K-500K/hour"
-    else:
-        severity = "MEDIUM"
-        revenue_risk = "$10K-100K/hour"
+    severity, revenue_risk = impact_estimate(len(impacted))
     
     simulation_result = {
         "failed_agent": {
@@ -610,7 +907,7 @@ async def simulate_failure(request: SimulateRequest):
         },
         "impacted_agents": impacted_agents,
         "impacted_count": len(impacted),
-        "blast_radius_score": round(blast_radius_score, 1),
+        "blast_radius_score": score,
         "impacted_workflows": workflows,
         "impact_estimate": {
             "severity": severity,
@@ -620,43 +917,252 @@ async def simulate_failure(request: SimulateRequest):
         "simulation_time": datetime.now().isoformat()
     }
     
-    app_state["simulation_result"] = simulation_result
+    state["simulation_result"] = simulation_result
     
     return simulation_result
 
-@app.post("/api/playbook")
-async def generate_playbook():
-    """Generate recovery playbook with audit trail using Gemini 3 API"""
+@app.post("/api/simulate/batch")
+async def simulate_failure_batch(request: BatchSimulateRequest, workspace: Workspace = Depends(current_workspace)):
+    """Blast radius for many agents in one pass, without touching the current simulation"""
+    
+    graph = workspace.state["graph"]
+    if graph is None or not graph.dependencies:
+        raise HTTPException(status_code=400, detail="No graph data available")
     
-    if not app_state["simulation_result"]:
+    if request.agent_ids == "all":
+        agent_ids = [a["id"] for a in graph.agents]
+    else:
+        agent_ids = request.agent_ids
+    
+    started = time.perf_counter()
+    results = await asyncio.to_thread(simulate_batch, graph, agent_ids)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    found = {r["agent_id"] for r in results}
+    return {
+        "results": results,
+        "total_agents": graph.agent_count,
+        "not_found": [a for a in agent_ids if a not in found],
+        "compute_ms": round(elapsed_ms, 1),
+        "simulation_time": datetime.now().isoformat()
+    }
+
+@app.post("/api/simulate/multi")
+async def simulate_multi_failure(request: MultiSimulateRequest, workspace: Workspace = Depends(current_workspace)):
+    """Simulate several agents failing at once (zone outage, shared dependency)"""
+    
+    graph = workspace.state["graph"]
+    if graph is None or not graph.dependencies:
+        raise HTTPException(status_code=400, detail="No graph data available")
+    
+    failed_ids = list(dict.fromkeys(request.agent_ids))
+    missing = [a for a in failed_ids if graph.get_agent(a) is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Agents not found: {', '.join(missing)}")
+    
+    impacted = simulate_multi(graph, failed_ids)
+    severity, revenue_risk = impact_estimate(len(impacted))
+    
+    return {
+        "failed_agents": [
+            {"id": a["id"], "name": a["name"], "type": a["type"]}
+            for a in graph.agents_for(failed_ids)
+        ],
+        "impacted_agents": graph.agents_for(impacted),
+        "impacted_count": len(impacted),
+        "blast_radius_score": blast_radius_score(len(impacted), graph.agent_count),
+        "impact_estimate": {
+            "severity": severity,
+            "revenue_risk": revenue_risk,
+            "estimated_recovery_time": "15-60 minutes"
+        },
+        "simulation_time": datetime.now().isoformat()
+    }
+
+@app.post("/api/simulate/worst-case")
+async def simulate_worst_case(request: WorstCaseRequest, workspace: Workspace = Depends(current_workspace)):
+    """Find the k agents whose joint failure impacts the most agents"""
+    
+    graph = workspace.state["graph"]
+    if graph is None or not graph.dependencies:
+        raise HTTPException(status_code=400, detail="No graph data available")
+    
+    started = time.perf_counter()
+    picks = await asyncio.to_thread(worst_case_failure_set, graph, request.k)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    failed_ids = [p["agent_id"] for p in picks]
+    impacted_count = picks[-1]["total_down"] - len(picks) if picks else 0
+    severity, revenue_risk = impact_estimate(impacted_count)
+    
+    return {
+        "k": request.k,
+        "failed_agents": picks,
+        "impacted_agents": graph.agents_for(simulate_multi(graph, failed_ids)),
+        "impacted_count": impacted_count,
+        "blast_radius_score": blast_radius_score(impacted_count, graph.agent_count),
+        "impact_estimate": {
+            "severity": severity,
+            "revenue_risk": revenue_risk,
+            "estimated_recovery_time": "15-60 minutes"
+        },
+        "compute_ms": round(elapsed_ms, 1),
+        "simulation_time": datetime.now().isoformat()
+    }
+
+@app.post("/api/simulate/monte-carlo")
+async def simulate_monte_carlo(request: MonteCarloRequest, workspace: Workspace = Depends(current_workspace)):
+    """Probabilistic cascade using each dependency's confidence as its propagation probability"""
+    
+    graph = workspace.state["graph"]
+    if graph is None or not graph.dependencies:
+        raise HTTPException(status_code=400, detail="No graph data available")
+    
+    failed_ids = list(dict.fromkeys(request.agent_ids))
+    missing = [a for a in failed_ids if graph.get_agent(a) is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Agents not found: {', '.join(missing)}")
+    
+    # Runs for up to the time budget, so off the event loop
+    result = await asyncio.to_thread(
+        monte_carlo_cascade,
+        graph,
+        failed_ids,
+        trials=request.trials,
+        seed=request.seed,
+        time_budget_ms=request.time_budget_ms
+    )
+    expected = result["blast_radius_distribution"]["mean"]
+    
+    return {
+        "failed_agents": failed_ids,
+        "seed": request.seed,
+        **result,
+        "expected_blast_radius_score": blast_radius_score(expected, graph.agent_count),
+        "simulation_time": datetime.now().isoformat()
+    }
+
+def _playbook_context(state: Dict[str, Any]):
+    """Current simulation, its failed agent and the graph, or an HTTP error"""
+    
+    if not state["simulation_result"]:
         raise HTTPException(status_code=400, detail="No simulation result available")
     
-    sim = app_state["simulation_result"]
-    failed_agent = next((a for a in app_state["agents"] if a["id"] == sim["failed_agent"]["id"]), None)
+    sim = state["simulation_result"]
+    graph = state["graph"]
+    failed_agent = graph.get_agent(sim["failed_agent"]["id"]) if graph else None
     
     if not failed_agent:
         raise HTTPException(status_code=404, detail="Failed agent not found")
     
+    return sim, failed_agent, graph
+
+@app.post("/api/playbook")
+async def generate_playbook(workspace: Workspace = Depends(current_workspace)):
+    """Generate recovery playbook with audit trail using Gemini 3 API"""
+    
+    state = workspace.state
+    
+    sim, failed_agent, graph = _playbook_context(state)
+    
     # Get impacted agents details
     impacted_agents = sim["impacted_agents"]
     
-    # Use Gemini 3 for incident analysis
-    incident_analysis = await gemini_service.analyze_incident(
-        failed_agent=failed_agent,
-        impacted_agents=impacted_agents,
-        dependencies=app_state["dependencies"]
-    )
+    # Served instantly if pre-generated after the scan
+    prewarmed = workspace.prewarmer.get(graph, failed_agent["id"])
+    if prewarmed:
+        incident_analysis, gemini_playbook = prewarmed
+    else:
+        # Use Gemini 3 for incident analysis
+        incident_analysis = await gemini_service.analyze_incident(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies
+        )
+        
+        # Use Gemini 3 to generate recovery playbook
+        gemini_playbook = await gemini_service.generate_playbook(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies,
+            incident_analysis=incident_analysis
+        )
+    
+    playbook = _build_playbook(sim, failed_agent, incident_analysis, gemini_playbook)
+    state["playbook"] = playbook
+    
+    return playbook
+
+def _sse(event: str, data: Any) -> str:
+    """One server-sent event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/playbook/stream")
+async def stream_playbook(workspace: Workspace = Depends(current_workspace)):
+    """
+    Same playbook as /api/playbook, streamed as server-sent events:
+    'analysis' when incident analysis is ready, one 'step' per phase as
+    Gemini writes it, then the complete 'playbook'
+    """
+    
+    state = workspace.state
+    
+    sim, failed_agent, graph = _playbook_context(state)
+    impacted_agents = sim["impacted_agents"]
     
-    # Use Gemini 3 to generate recovery playbook
-    gemini_playbook = await gemini_service.generate_playbook(
-        failed_agent=failed_agent,
-        impacted_agents=impacted_agents,
-        dependencies=app_state["dependencies"],
-        incident_analysis=incident_analysis
+    async def events():
+        prewarmed = workspace.prewarmer.get(graph, failed_agent["id"])
+        if prewarmed:
+            incident_analysis, gemini_playbook = prewarmed
+            yield _sse("analysis", incident_analysis)
+            for step in gemini_playbook.get("steps", []):
+                yield _sse("step", step)
+            playbook = _build_playbook(sim, failed_agent, incident_analysis, gemini_playbook)
+            state["playbook"] = playbook
+            await workspace_store.commit(workspace)
+            yield _sse("playbook", playbook)
+            return
+        
+        incident_analysis = await gemini_service.analyze_incident(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies
+        )
+        yield _sse("analysis", incident_analysis)
+        
+        gemini_playbook: Dict[str, Any] = {}
+        async for kind, payload in gemini_service.stream_playbook(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies,
+            incident_analysis=incident_analysis
+        ):
+            if kind == "step":
+                yield _sse("step", payload)
+            else:
+                gemini_playbook = payload
+        
+        playbook = _build_playbook(sim, failed_agent, incident_analysis, gemini_playbook)
+        state["playbook"] = playbook
+        await workspace_store.commit(workspace)
+        yield _sse("playbook", playbook)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+def _build_playbook(
+    sim: Dict[str, Any],
+    failed_agent: Dict[str, Any],
+    incident_analysis: Dict[str, Any],
+    gemini_playbook: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Full playbook response: Gemini output plus defaults and audit trail"""
     
     # Build comprehensive playbook with Gemini insights
-    playbook = {
+    return {
         "incident": gemini_playbook.get("incident_title", f"{failed_agent['name']} Failure"),
         "estimated_recovery_time": gemini_playbook.get("estimated_recovery_time", "15-30 minutes"),
         "severity": sim["impact_estimate"]["severity"],
@@ -763,19 +1269,123 @@ async def generate_playbook():
         },
         "generated_at": datetime.now().isoformat()
     }
+
+@app.post("/api/risk/explain")
+async def explain_risks(request: RiskExplainRequest, workspace: Workspace = Depends(current_workspace)):
+    """
+    Gemini explanations of the /api/graph risk scores for all (or a
+    filtered set of) agents, streamed as server-sent events as batches finish
+    """
     
-    app_state["playbook"] = playbook
+    graph = workspace.state["graph"]
+    if graph is None or not graph.agents:
+        raise HTTPException(status_code=400, detail="No agents scanned yet")
     
-    return playbook
+    if request.agent_ids is None:
+        agents = graph.agents
+    else:
+        missing = [a for a in request.agent_ids if graph.get_agent(a) is None]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Agents not found: {', '.join(missing)}")
+        agents = graph.agents_for(list(dict.fromkeys(request.agent_ids)))
+    
+    risk_scores = risk_assessment(graph)["risk_scores"]
+    spofs = single_points_of_failure(graph)["spof_details"]
+    agents = [
+        agent for agent in agents
+        if risk_scores[agent["id"]] >= request.min_risk_score
+        and (agent["id"] in spofs or not request.spof_only)
+    ]
+    downstream = batch_impacted_counts(graph, [graph.index[a["id"]] for a in agents]).tolist()
+    items = [
+        {
+            "agent": agent,
+            "risk_score": risk_scores[agent["id"]],
+            "is_spof": agent["id"] in spofs,
+            "downstream_count": count
+        }
+        for agent, count in zip(agents, downstream)
+    ]
+    by_id = {item["agent"]["id"]: item for item in items}
+    
+    async def events():
+        done = 0
+        async for result in gemini_service.explain_risk_bulk(items):
+            item = by_id[result["agent_id"]]
+            done += 1
+            yield _sse("explanation", {
+                "agent_id": result["agent_id"],
+                "risk_score": item["risk_score"],
+                "is_spof": item["is_spof"],
+                "downstream_count": item["downstream_count"],
+                "explanation": result["explanation"],
+                "completed": done,
+                "total": len(items)
+            })
+        yield _sse("done", {"total": len(items)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/evidence/batch")
+async def explain_dependencies(request: EvidenceBatchRequest, workspace: Workspace = Depends(current_workspace)):
+    """
+    Gemini evidence reasoning for every dependency edge (optionally only
+    edges from some source agents), streamed as server-sent events
+    """
+    
+    graph = workspace.state["graph"]
+    if graph is None or not graph.dependencies:
+        raise HTTPException(status_code=400, detail="No graph data available")
+    
+    if request.sources is None:
+        dependencies = graph.dependencies
+    else:
+        wanted = [graph.index[a] for a in request.sources if a in graph.index]
+        dependencies = [graph.dependencies[e] for node in wanted for e in graph.out_edges[node]]
+    
+    async def events():
+        counts = {"cached": 0, "gemini": 0, "fallback": 0}
+        async for result in gemini_service.generate_evidence_bulk(dependencies, group_by=request.group_by):
+            counts[result["origin"]] += 1
+            dep = result["dependency"]
+            yield _sse("evidence", {
+                "source": dep["source"],
+                "target": dep["target"],
+                "type": dep["type"],
+                "confidence": dep["confidence"],
+                "reasoning": result["reasoning"],
+                "origin": result["origin"]
+            })
+        yield _sse("done", {"total": len(dependencies), **counts})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/state")
-async def get_state():
+async def get_state(workspace: Workspace = Depends(current_workspace)):
     """Get current application state (for debugging)"""
+    
+    state = workspace.state
+    
     return {
-        "has_agents": len(app_state["agents"]) > 0,
-        "has_graph": app_state["graph_data"] is not None,
-        "has_simulation": app_state["simulation_result"] is not None,
-        "has_playbook": app_state["playbook"] is not None
+        "has_agents": len(state["agents"]) > 0,
+        "has_graph": state["graph_data"] is not None,
+        "has_simulation": state["simulation_result"] is not None,
+        "has_playbook": state["playbook"] is not None,
+        "closure_cache": state["graph"].cache_stats() if state["graph"] else {"built": False},
+        "llm_cache": gemini_service.cache_stats(),
+        "gemini": gemini_service.resilience_stats(),
+        "workspace": workspace.id,
+        "workspaces": workspace_store.stats(),
+        "playbook_prewarm": workspace.prewarmer.stats(),
+        "startup": startup_profile.report()
     }
 
 if __name__ == "__main__":
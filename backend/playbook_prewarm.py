@@ -0,0 +1,141 @@
+"""
+Playbook Pre-generation for AgentGuard
+Background work started after each scan:
+- Rank agents by blast radius, in a worker thread
+- Generate incident analysis and playbooks for the top N in a bounded worker pool
+- Keep only real Gemini answers: failures are listed, never stored as mocks
+- Serve the stored results to /api/playbook for the scan they were built from
+- One instance per workspace
+- Gemini calls run at background priority and wait out interactive requests
+"""
+
+import os
+import asyncio
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+from gemini_service import gemini_service
+from graph_engine import AgentGraph
+from simulator import simulate_batch
+
+PLAYBOOK_PREWARM_TOP_N = int(os.getenv("PLAYBOOK_PREWARM_TOP_N", "10"))
+PLAYBOOK_PREWARM_WORKERS = int(os.getenv("PLAYBOOK_PREWARM_WORKERS", "2"))
+
+
+class PlaybookPrewarmer:
+    """Pre-generated (incident_analysis, gemini_playbook) pairs for one scan"""
+
+    def __init__(self, top_n: int, workers: int):
+        self.top_n = top_n
+        self.workers = workers
+        self.version: Optional[str] = None
+        self.queued: List[str] = []
+        self.results: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        self.failed: List[str] = []
+        self.hits = 0
+        self.started_at = 0.0
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def cancel(self) -> None:
+        """Stop any pre-generation still running"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def start(self, graph: AgentGraph) -> None:
+        """
+        Drop results for the previous scan and pre-generate for this one.
+        Nothing is pre-generated while Gemini is unavailable: the mock
+        fallbacks are instant and are never stored.
+        """
+        self.cancel()
+
+        self.version = graph.content_hash
+        self.queued = []
+        self.results = {}
+        self.failed = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        if self.top_n <= 0 or not graph.dependencies or not gemini_service.is_available():
+            self.finished_at = self.started_at
+            return
+
+        self._task = asyncio.create_task(self._run(graph, self.version))
+
+    def _rank(self, graph: AgentGraph) -> List[str]:
+        ranked = simulate_batch(graph, [a["id"] for a in graph.agents])
+        ranked.sort(key=lambda r: r["impacted_count"], reverse=True)
+        return [r["agent_id"] for r in ranked[:self.top_n] if r["impacted_count"] > 0]
+
+    def get(self, graph: AgentGraph, agent_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Stored results for agent_id, if pre-generated for this exact scan"""
+        if graph is None or graph.content_hash != self.version:
+            return None
+        found = self.results.get(agent_id)
+        if found is not None:
+            self.hits += 1
+        return found
+
+    async def _run(self, graph: AgentGraph, version: str) -> None:
+        agent_ids = await asyncio.to_thread(self._rank, graph)
+        if self.version != version:
+            return
+        self.queued = list(agent_ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        for agent_id in agent_ids:
+            queue.put_nowait(agent_id)
+
+        async def worker():
+            with gemini_service.background():
+                while not queue.empty():
+                    agent_id = queue.get_nowait()
+                    try:
+                        result = await self._generate(graph, agent_id)
+                    except Exception as e:
+                        print(f"Playbook pre-generation failed for {agent_id}: {e}")
+                        if self.version == version:
+                            self.failed.append(agent_id)
+                        continue
+                    if self.version == version:
+                        self.results[agent_id] = result
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(agent_ids)))))
+        if self.version == version:
+            self.finished_at = time.monotonic()
+
+    async def _generate(self, graph: AgentGraph, agent_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Same Gemini calls /api/playbook makes after simulating agent_id,
+        raising where it would fall back to a mock
+        """
+        failed_agent = graph.get_agent(agent_id)
+        impacted_agents = graph.agents_for(graph.closure.reachable(agent_id))
+
+        incident_analysis = await gemini_service.analyze_incident(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies,
+            fallback=False
+        )
+        gemini_playbook = await gemini_service.generate_playbook(
+            failed_agent=failed_agent,
+            impacted_agents=impacted_agents,
+            dependencies=graph.dependencies,
+            incident_analysis=incident_analysis,
+            fallback=False
+        )
+        return incident_analysis, gemini_playbook
+
+    def stats(self) -> Dict[str, Any]:
+        running = self._task is not None and not self._task.done()
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at if self.version else 0.0
+        return {
+            "version": self.version,
+            "running": running,
+            "queued": len(self.queued),
+            "ready": sorted(self.results),
+            "failed": self.failed,
+            "hits": self.hits,
+            "elapsed_ms": round(elapsed * 1000, 1)
+        }
+
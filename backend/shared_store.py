@@ -0,0 +1,276 @@
+"""
+Shared State Store for AgentGuard
+Workspace state in SQLite (WAL mode), so several uvicorn workers serve the
+same scans:
+- One row per workspace: scan version, scan/simulation/playbook JSON, revision
+- One row per scan version: the AgentGraph, serialized compactly, plus one
+  row per derived index, each written once as it gets built
+- Workers re-read a workspace only when its revision has moved
+- Reads go through their own connection, so they never queue behind a
+  large graph write (WAL lets readers and the writer run concurrently)
+- Scan versions double as durable snapshots: the newest are kept even when no
+  workspace points at them, and each workspace can list and re-scan by id
+  the ones it has scanned
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+AGENTGUARD_STATE_PATH = os.getenv("AGENTGUARD_STATE_PATH", "agentguard_state.sqlite3")
+AGENTGUARD_SNAPSHOT_RETENTION = int(os.getenv("AGENTGUARD_SNAPSHOT_RETENTION", "20"))
+
+# Workspace fields stored as JSON columns
+JSON_FIELDS = ("scan_result", "simulation_result", "playbook")
+
+# Restricts a graphs query to the versions one workspace has scanned
+OWNED_BY = (
+    "version IN (SELECT version FROM workspace_snapshots WHERE workspace_id = ?)"
+)
+
+# Snapshot metadata columns added to the graphs table after it first shipped
+SNAPSHOT_COLUMNS = {"demo_type": "TEXT", "agent_count": "INTEGER", "dependency_count": "INTEGER"}
+
+
+class SharedStateStore:
+    """SQLite-backed workspace rows and serialized graphs; disabled when path is empty"""
+
+    def __init__(self, path: str, snapshot_retention: int):
+        self.path = path
+        self.snapshot_retention = snapshot_retention
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Read connection with its own lock; the writer's is held for the
+        # whole of a (possibly large) insert
+        self._reader: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS workspaces ("
+                    "id TEXT PRIMARY KEY, scan_version TEXT, scan_result TEXT, "
+                    "simulation_result TEXT, playbook TEXT, revision INTEGER NOT NULL, updated_at REAL)"
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS graphs ("
+                    "version TEXT PRIMARY KEY, data BLOB, created_at REAL)"
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS graph_indexes ("
+                    "version TEXT, name TEXT, data BLOB, PRIMARY KEY (version, name))"
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS workspace_snapshots ("
+                    "workspace_id TEXT, version TEXT, PRIMARY KEY (workspace_id, version))"
+                )
+                existing = {row[1] for row in self._db.execute("PRAGMA table_info(graphs)")}
+                for column, kind in SNAPSHOT_COLUMNS.items():
+                    if column not in existing:
+                        self._db.execute(f"ALTER TABLE graphs ADD COLUMN {column} {kind}")
+                self._db.commit()
+                if path == ":memory:":
+                    self._reader, self._read_lock = self._db, self._lock
+                else:
+                    self._reader = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            except sqlite3.Error as e:
+                print(f"Warning: shared state store disabled: {e}")
+                self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def revision(self, workspace_id: str) -> Optional[int]:
+        """Current revision of a workspace row, or None if it was never saved"""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT revision FROM workspaces WHERE id = ?", (workspace_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_workspace(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        """scan_version, revision and decoded JSON fields of a workspace"""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT scan_version, scan_result, simulation_result, playbook, revision "
+                "FROM workspaces WHERE id = ?", (workspace_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        self.reads += 1
+        loaded = {"scan_version": row[0], "revision": row[4]}
+        for name, value in zip(JSON_FIELDS, row[1:4]):
+            loaded[name] = json.loads(value) if value is not None else None
+        return loaded
+
+    def save_workspace(self, workspace_id: str, changes: Dict[str, Any]) -> int:
+        """
+        Write only the changed fields (scan_version and/or JSON_FIELDS) and
+        bump the revision. Returns the new revision.
+        """
+        columns = list(changes)
+        values = [
+            json.dumps(changes[c]) if c in JSON_FIELDS and changes[c] is not None else changes[c]
+            for c in columns
+        ]
+        assignments = ", ".join(f"{c} = excluded.{c}" for c in columns)
+        with self._lock:
+            row = self._db.execute(
+                f"INSERT INTO workspaces (id, {', '.join(columns)}, revision, updated_at) "
+                f"VALUES (?, {', '.join('?' for _ in columns)}, 1, ?) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}, "
+                "revision = workspaces.revision + 1, updated_at = excluded.updated_at "
+                "RETURNING revision",
+                (workspace_id, *values, time.time())
+            ).fetchone()
+            if changes.get("scan_version"):
+                self._db.execute(
+                    "INSERT OR IGNORE INTO workspace_snapshots (workspace_id, version) VALUES (?, ?)",
+                    (workspace_id, changes["scan_version"])
+                )
+            self._db.commit()
+        self.writes += 1
+        return row[0]
+
+    def graph_indexes(self, version: str) -> Optional[List[str]]:
+        """Which derived indexes are stored for a version, or None if its graph is not"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM graphs WHERE version = ?", (version,)).fetchone()
+            if row is None:
+                return None
+            names = self._db.execute(
+                "SELECT name FROM graph_indexes WHERE version = ?", (version,)
+            ).fetchall()
+        return [n for (n,) in names]
+
+    def load_graph(self, version: str) -> Optional[Tuple[bytes, Dict[str, bytes]]]:
+        """Serialized graph of a version and its stored indexes by name"""
+        with self._read_lock:
+            row = self._reader.execute("SELECT data FROM graphs WHERE version = ?", (version,)).fetchone()
+            if row is None:
+                return None
+            indexes = self._reader.execute(
+                "SELECT name, data FROM graph_indexes WHERE version = ?", (version,)
+            ).fetchall()
+        self.reads += 1
+        return row[0], dict(indexes)
+
+    def save_graph(
+        self,
+        version: str,
+        data: bytes,
+        demo_type: Optional[str],
+        agent_count: int,
+        dependency_count: int
+    ) -> None:
+        """Insert a snapshot; a version's scan content never changes once stored"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO graphs (version, data, created_at, demo_type, agent_count, dependency_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (version, data, time.time(), demo_type, agent_count, dependency_count)
+            )
+            self._db.commit()
+        self.writes += 1
+
+    def save_graph_index(self, version: str, name: str, data: bytes) -> None:
+        """Store one derived index of a snapshot"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO graph_indexes (version, name, data) VALUES (?, ?, ?)",
+                (version, name, data)
+            )
+            self._db.commit()
+        self.writes += 1
+
+    def snapshot(self, version: str, workspace_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata of one snapshot the workspace has scanned, or None"""
+        snapshots = self._snapshots(f"WHERE version = ? AND {OWNED_BY}", (version, workspace_id))
+        return snapshots[0] if snapshots else None
+
+    def list_snapshots(self, limit: int = 50, workspace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Snapshot metadata, newest first; only a workspace's own when given one"""
+        if workspace_id is None:
+            return self._snapshots("ORDER BY created_at DESC LIMIT ?", (limit,))
+        return self._snapshots(f"WHERE {OWNED_BY} ORDER BY created_at DESC LIMIT ?", (workspace_id, limit))
+
+    def _snapshots(self, clause: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT version, demo_type, agent_count, dependency_count, "
+                "(SELECT GROUP_CONCAT(name) FROM graph_indexes i "
+                "WHERE i.version = graphs.version), created_at, "
+                "LENGTH(data) + COALESCE((SELECT SUM(LENGTH(data)) FROM graph_indexes i "
+                "WHERE i.version = graphs.version), 0) "
+                f"FROM graphs {clause}", params
+            ).fetchall()
+        return [
+            {
+                "snapshot_id": version,
+                "demo_type": demo_type,
+                "agent_count": agent_count,
+                "dependency_count": dependency_count,
+                "indexes": [name for name in (indexes or "").split(",") if name],
+                "created_at": datetime.fromtimestamp(created_at).isoformat(),
+                "bytes": size
+            }
+            for version, demo_type, agent_count, dependency_count, indexes, created_at, size in rows
+        ]
+
+    def prune(self, max_workspaces: int) -> None:
+        """
+        Drop the least recently updated workspaces beyond the limit, then
+        snapshots that are neither referenced nor among the newest retained
+        """
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM workspaces WHERE id NOT IN "
+                "(SELECT id FROM workspaces ORDER BY updated_at DESC LIMIT ?)", (max_workspaces,)
+            )
+            self._db.execute(
+                "DELETE FROM graphs WHERE version NOT IN "
+                "(SELECT scan_version FROM workspaces WHERE scan_version IS NOT NULL) "
+                "AND version NOT IN (SELECT version FROM graphs ORDER BY created_at DESC LIMIT ?)",
+                (self.snapshot_retention,)
+            )
+            self._db.execute("DELETE FROM graph_indexes WHERE version NOT IN (SELECT version FROM graphs)")
+            self._db.execute(
+                "DELETE FROM workspace_snapshots WHERE version NOT IN (SELECT version FROM graphs) "
+                "OR workspace_id NOT IN (SELECT id FROM workspaces)"
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._read_lock:
+            workspaces = self._reader.execute("SELECT COUNT(*) FROM workspaces").fetchone()[0]
+            graphs, graph_bytes = self._reader.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM graphs"
+            ).fetchone()
+            graph_bytes += self._reader.execute(
+                "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM graph_indexes"
+            ).fetchone()[0]
+        return {
+            "enabled": True,
+            "path": self.path,
+            "workspaces": workspaces,
+            "snapshots": graphs,
+            "snapshot_retention": self.snapshot_retention,
+            "graph_bytes": graph_bytes,
+            "reads": self.reads,
+            "writes": self.writes
+        }
+
+
+# Global instance
+shared_store = SharedStateStore(AGENTGUARD_STATE_PATH, AGENTGUARD_SNAPSHOT_RETENTION)
@@ -0,0 +1,378 @@
+"""
+Simulator Service for AgentGuard
+Failure simulations over an AgentGraph:
+- Blast radius score and impact estimates
+- Batch blast radius for many agents via word-packed bitset propagation
+- Simultaneous multi-agent failures and worst-case k-set search
+- Monte Carlo cascades where each edge carries with its confidence
+"""
+
+import heapq
+import time
+from typing import Dict, List, Any, Tuple
+import numpy as np
+
+from graph_engine import AgentGraph, bits_to_indices
+
+# Upper bound on the reachability matrix held in memory at once. Larger
+# graphs are processed in column blocks of at most this size.
+BITSET_BLOCK_BYTES = 64 * 1024 * 1024
+
+# Candidates worst_case_failure_set re-scores one at a time in a round
+# before re-scoring all of them in one batch pass
+WORST_CASE_RESCORE_LIMIT = 64
+
+# Monte Carlo limits: (nodes or edges) x trials handled per chunk, and the
+# percentiles reported for the blast-radius distribution
+MONTE_CARLO_CHUNK_CELLS = 4 * 1024 * 1024
+# Trials in the first chunk, kept small so a tight time budget still
+# completes some trials
+MONTE_CARLO_FIRST_CHUNK = 64
+MONTE_CARLO_PERCENTILES = (5, 25, 50, 75, 90, 95, 99)
+
+
+def blast_radius_score(impacted_count: int, total_agents: int) -> float:
+    """Blast radius on a 0-10 scale from the share of impacted agents"""
+    impact_ratio = impacted_count / total_agents if total_agents > 0 else 0
+    return round(min(impact_ratio * 15, 10), 1)
+
+
+def impact_estimate(impacted_count: int) -> Tuple[str, str]:
+    """Severity and revenue risk bucket for an impacted count"""
+    if impacted_count > 10:
+        return "CRITICAL", "$500K-2M/hour"
+    elif impacted_count > 5:
+        return "HIGH", "$100K-500K/hour"
+    else:
+        return "MEDIUM", "$10K-100K/hour"
+
+
+def _condensed_levels(graph: AgentGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Deduplicated edges of the SCC-condensed DAG plus each component's level
+    (longest path to a sink). Every edge goes from a higher level to a
+    strictly lower one, so processing levels in ascending order is a valid
+    propagation schedule.
+    """
+    comp_of, components = graph.components
+    comp_of_arr = np.asarray(comp_of, dtype=np.int64)
+    src = comp_of_arr[np.asarray(graph.edge_sources, dtype=np.int64)]
+    dst = comp_of_arr[np.asarray(graph.edge_targets, dtype=np.int64)]
+    keep = src != dst
+    if keep.any():
+        pairs = np.unique(np.stack([src[keep], dst[keep]], axis=1), axis=0)
+        src, dst = pairs[:, 0], pairs[:, 1]
+    else:
+        src = dst = np.empty(0, dtype=np.int64)
+
+    # Components are numbered in reverse topological order (sinks first), so
+    # one ascending pass over edges sorted by source fixes every level.
+    level = [0] * len(components)
+    order = np.argsort(src, kind="stable")
+    for s, d in zip(src[order].tolist(), dst[order].tolist()):
+        if level[d] + 1 > level[s]:
+            level[s] = level[d] + 1
+    return src, dst, np.asarray(level, dtype=np.int64)
+
+
+def batch_impacted_counts(graph: AgentGraph, nodes: List[int]) -> np.ndarray:
+    """Number of nodes reachable from each node in `nodes` (excluding itself)"""
+    if not nodes:
+        return np.zeros(0, dtype=np.int64)
+    return batch_reach_sizes(graph, nodes) - 1
+
+
+def batch_reach_sizes(graph: AgentGraph, nodes: List[int], exclude: int = 0) -> np.ndarray:
+    """
+    Size of the reach set of each node in `nodes` (itself included), not
+    counting nodes in the `exclude` bitset, computed for all of them in one
+    pass. Each component gets a row of uint64 words with one bit per graph
+    node; rows are OR-ed along condensed edges one level at a time, then
+    popcounted. Columns are processed in blocks so memory stays under
+    BITSET_BLOCK_BYTES.
+    """
+    comp_of, components = graph.components
+    n_nodes = graph.node_count
+    n_comps = len(components)
+    if not nodes or n_nodes == 0:
+        return np.zeros(len(nodes), dtype=np.int64)
+
+    src, dst, level = _condensed_levels(graph)
+    # Sources sit at level 1 and up; sinks (level 0) have no edges
+    by_level = [
+        (src[group], dst[group])
+        for group in _group_by(level[src], int(level.max()) + 1)[1:]
+    ]
+
+    comp_of_arr = np.asarray(comp_of, dtype=np.int64)
+    wanted = comp_of_arr[np.asarray(nodes, dtype=np.int64)]
+    counts = np.zeros(len(nodes), dtype=np.int64)
+    excluded = np.unpackbits(
+        np.frombuffer(exclude.to_bytes((n_nodes + 7) // 8, "little"), dtype=np.uint8),
+        count=n_nodes, bitorder="little"
+    ).astype(bool)
+
+    total_words = (n_nodes + 63) // 64
+    block_words = max(1, min(total_words, BITSET_BLOCK_BYTES // (8 * n_comps)))
+    for first_word in range(0, total_words, block_words):
+        words = min(block_words, total_words - first_word)
+        lo = first_word * 64
+        hi = min(n_nodes, lo + words * 64)
+        cols = np.flatnonzero(~excluded[lo:hi])
+
+        bits = np.zeros((n_comps, words), dtype=np.uint64)
+        np.bitwise_or.at(
+            bits,
+            (comp_of_arr[lo + cols], cols // 64),
+            np.left_shift(np.uint64(1), (cols % 64).astype(np.uint64)),
+        )
+        for level_src, level_dst in by_level:
+            np.bitwise_or.at(bits, level_src, bits[level_dst])
+
+        counts += np.bitwise_count(bits[wanted]).sum(axis=1, dtype=np.int64)
+
+    return counts
+
+
+def simulate_batch(graph: AgentGraph, agent_ids: List[str]) -> List[Dict[str, Any]]:
+    """Blast radius summary for every id in agent_ids that is a scanned agent"""
+    agents = [graph.get_agent(a) for a in agent_ids]
+    found = [a for a in agents if a is not None]
+    counts = batch_impacted_counts(graph, [graph.index[a["id"]] for a in found])
+
+    total_agents = graph.agent_count
+    results = []
+    for agent, count in zip(found, counts.tolist()):
+        severity, revenue_risk = impact_estimate(count)
+        results.append({
+            "agent_id": agent["id"],
+            "name": agent["name"],
+            "impacted_count": count,
+            "blast_radius_score": blast_radius_score(count, total_agents),
+            "severity": severity,
+            "revenue_risk": revenue_risk,
+        })
+    return results
+
+
+def simulate_multi(graph: AgentGraph, agent_ids: List[str]) -> List[str]:
+    """
+    Ids impacted when every agent in agent_ids fails at once: the union of
+    their reach sets, minus the failed agents themselves
+    """
+    closure = graph.closure
+    failed = 0
+    down = 0
+    for agent_id in agent_ids:
+        node = graph.index[agent_id]
+        failed |= 1 << node
+        down |= closure.reach_of(closure.comp_of[node])
+    ids = graph.ids
+    return [ids[i] for i in bits_to_indices(down & ~failed)]
+
+
+def worst_case_failure_set(graph: AgentGraph, k: int) -> List[Dict[str, Any]]:
+    """
+    Greedy search for the k agents whose joint failure takes down the most
+    nodes. Coverage of reach sets is monotone submodular, so greedy is
+    within (1 - 1/e) of optimal, and marginal gains only shrink as the set
+    grows: a stale gain is an upper bound, which lets lazy greedy re-score
+    only the heap top instead of every candidate each round. A round that
+    re-scores more than WORST_CASE_RESCORE_LIMIT candidates one by one
+    re-scores all of them in one batch pass instead.
+    Returns one entry per pick with its marginal gain and running total.
+    """
+    closure = graph.closure
+    index = graph.index
+
+    # Members of one SCC share a reach set, so one candidate per component
+    candidates: Dict[int, int] = {}
+    for agent in graph.agents:
+        comp = closure.comp_of[index[agent["id"]]]
+        candidates.setdefault(comp, index[agent["id"]])
+
+    # Gains come from the batch bitset pass; reach sets are only fetched
+    # for candidates that reach the top of the heap
+    nodes = list(candidates.values())
+
+    def batch_heap(covered: int) -> List[Tuple[int, int, int]]:
+        sizes = batch_reach_sizes(graph, nodes, exclude=covered).tolist()
+        heap = [(-size, node, closure.comp_of[node]) for size, node in zip(sizes, nodes)]
+        heapq.heapify(heap)
+        return heap
+
+    heap = batch_heap(0)
+    covered = 0
+    rescored = 0
+    picks: List[Dict[str, Any]] = []
+    while heap and len(picks) < k:
+        if rescored >= WORST_CASE_RESCORE_LIMIT:
+            heap = batch_heap(covered)
+            rescored = 0
+        neg_gain, node, comp = heapq.heappop(heap)
+        reach = closure.reach_of(comp)
+        gain = (reach & ~covered).bit_count()
+        rescored += 1
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, node, comp))
+            continue
+        if gain == 0:
+            break
+        covered |= reach
+        rescored = 0
+        picks.append({
+            "agent_id": graph.ids[node],
+            "marginal_gain": gain,
+            "total_down": covered.bit_count(),
+        })
+    return picks
+
+
+def _group_by(keys: np.ndarray, n_groups: int) -> List[np.ndarray]:
+    """Positions of keys equal to 0..n_groups-1, one array per key"""
+    order = np.argsort(keys, kind="stable")
+    bounds = np.searchsorted(keys[order], np.arange(n_groups + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n_groups)]
+
+
+def monte_carlo_cascade(
+    graph: AgentGraph,
+    agent_ids: List[str],
+    trials: int,
+    seed: int = None,
+    time_budget_ms: float = 2000.0,
+) -> Dict[str, Any]:
+    """
+    Probabilistic cascade from a set of failed agents. In every trial each
+    dependency edge propagates the failure with probability equal to its
+    confidence. Trials are packed into the bits of a uint64 row per node and
+    sampled as (edges x trials) boolean matrices; rows are propagated over
+    the reachable subgraph one condensation level at a time, iterating to a
+    fixpoint only inside SCCs. Runs in chunks of trials, each bounded by
+    MONTE_CARLO_CHUNK_CELLS in both nodes and edges; once time_budget_ms is
+    spent the chunk in progress is dropped and only completed trials are
+    reported.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    closure = graph.closure
+
+    failed_nodes = [graph.index[a] for a in agent_ids]
+    reach = 0
+    for node in failed_nodes:
+        reach |= closure.reach_of(closure.comp_of[node])
+    nodes = np.asarray(bits_to_indices(reach), dtype=np.int64)
+
+    # Remap the reachable subgraph to dense local indices
+    local = np.full(graph.node_count, -1, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes))
+    src = local[np.asarray(graph.edge_sources, dtype=np.int64)]
+    dst = local[np.asarray(graph.edge_targets, dtype=np.int64)]
+    inside = (src >= 0) & (dst >= 0)
+    src, dst = src[inside], dst[inside]
+    confidence = np.asarray(
+        [float(d.get("confidence", 1.0)) for d in graph.dependencies]
+    )[inside]
+    seeds = local[np.asarray(failed_nodes, dtype=np.int64)]
+
+    # Depth of each SCC below the failure. Components are numbered sinks
+    # first, so visiting edges by descending source component is topological.
+    comp = np.asarray(closure.comp_of, dtype=np.int64)[nodes]
+    src_comp, dst_comp = comp[src], comp[dst]
+    cross = src_comp != dst_comp
+    depth = dict.fromkeys(comp.tolist(), 0)
+    order = np.argsort(-src_comp[cross], kind="stable")
+    for s, d in zip(src_comp[cross][order].tolist(), dst_comp[cross][order].tolist()):
+        if depth[s] + 1 > depth[d]:
+            depth[d] = depth[s] + 1
+    edge_depth = np.asarray([depth[c] for c in dst_comp.tolist()], dtype=np.int64)
+    n_levels = max(depth.values(), default=0) + 1
+    cross_groups = _group_by(np.where(cross, edge_depth, n_levels), n_levels + 1)[:n_levels]
+    inner_groups = _group_by(np.where(cross, n_levels, edge_depth), n_levels + 1)[:n_levels]
+
+    # Per level: edges sorted by target, so the OR into each target row is
+    # one reduceat over contiguous runs instead of a scattered ufunc.at
+    schedule = []
+    for level in range(n_levels):
+        for group, fixpoint in ((cross_groups[level], False), (inner_groups[level], True)):
+            if len(group) == 0:
+                continue
+            group = group[np.argsort(dst[group], kind="stable")]
+            targets, starts = np.unique(dst[group], return_index=True)
+            schedule.append((group, src[group], targets, starts, fixpoint))
+
+    n_local = len(nodes)
+    chunk = int(min(trials, max(64, MONTE_CARLO_CHUNK_CELLS // max(1, n_local, len(src)))))
+    deadline = started + time_budget_ms / 1000
+    hits = np.zeros(n_local, dtype=np.int64)
+    sizes: List[np.ndarray] = []
+    completed = 0
+    while completed < trials and time.perf_counter() < deadline:
+        batch = min(chunk if completed else min(chunk, MONTE_CARLO_FIRST_CHUNK), trials - completed)
+
+        # Trial bits are packed into uint64 words; padding trials beyond
+        # `batch` never get seeded, so they stay clear
+        width = (batch + 63) // 64 * 64
+        seeded = np.zeros(width, dtype=bool)
+        seeded[:batch] = True
+        down = np.zeros((n_local, width // 64), dtype=np.uint64)
+        down[seeds] = np.packbits(seeded).view(np.uint64)
+        # Edge draws are made a slice of rows at a time, so the float
+        # matrix never exceeds MONTE_CARLO_CHUNK_CELLS
+        rows = max(1, MONTE_CARLO_CHUNK_CELLS // width)
+        timed_out = False
+        for group, g_src, targets, starts, fixpoint in schedule:
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+            keep = np.empty((len(group), width // 64), dtype=np.uint64)
+            for lo in range(0, len(group), rows):
+                part = group[lo:lo + rows]
+                keep[lo:lo + rows] = np.packbits(
+                    rng.random((len(part), width)) < confidence[part][:, None], axis=1
+                ).view(np.uint64)
+            while True:
+                spread = np.bitwise_or.reduceat(down[g_src] & keep, starts, axis=0)
+                spread &= ~down[targets]
+                if not spread.any():
+                    break
+                down[targets] |= spread
+                if not fixpoint:
+                    break
+        if timed_out:
+            break
+
+        impacted = np.unpackbits(down.view(np.uint8), axis=1, count=batch)
+        impacted[seeds] = 0
+        hits += impacted.sum(axis=1, dtype=np.int64)
+        sizes.append(impacted.sum(axis=0, dtype=np.int64))
+        completed += batch
+
+    counts = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+    probability = hits / completed if completed else hits.astype(float)
+    impact = {
+        graph.ids[node]: round(float(p), 4)
+        for node, p in zip(nodes.tolist(), probability.tolist())
+        if p > 0
+    }
+    histogram = np.bincount(counts) if len(counts) else np.zeros(0, dtype=np.int64)
+
+    return {
+        "trials_requested": trials,
+        "trials_completed": completed,
+        "impact_probabilities": dict(sorted(impact.items(), key=lambda kv: -kv[1])),
+        "blast_radius_distribution": {
+            "mean": round(float(counts.mean()), 2) if completed else 0.0,
+            "min": int(counts.min()) if completed else 0,
+            "max": int(counts.max()) if completed else 0,
+            "percentiles": {
+                f"p{q}": float(np.percentile(counts, q)) if completed else 0.0
+                for q in MONTE_CARLO_PERCENTILES
+            },
+            "histogram": [
+                {"impacted_count": size, "trials": int(n)}
+                for size, n in enumerate(histogram.tolist()) if n
+            ],
+        },
+        "compute_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,58 @@
+"""
+Startup Profiling for AgentGuard
+Wall-clock timings for cold start, so it can be held under a budget:
+- Per-import and per-init steps, in the order they ran
+- Background steps (e.g. Gemini SDK warm-up) that finish after readiness
+- Total time to ready against STARTUP_BUDGET_MS
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+
+class StartupProfile:
+    """Named step timings measured from the moment this module is imported"""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+        self.ready_ms: Optional[float] = None
+
+    @contextmanager
+    def step(self, name: str, background: bool = False):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, background)
+
+    def record(self, name: str, ms: float, background: bool = False) -> None:
+        self.steps.append({"step": name, "ms": round(ms, 1), "background": background})
+
+    def mark_ready(self) -> None:
+        self.ready_ms = (time.perf_counter() - self.started) * 1000
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            "budget_ms": self.budget_ms,
+            "within_budget": self.ready_ms is not None and self.ready_ms <= self.budget_ms
+        }
+
+    def log(self) -> None:
+        """Print the startup report, one line per step"""
+        for s in self.steps:
+            suffix = " (background)" if s["background"] else ""
+            print(f"startup: {s['step']:<32} {s['ms']:>8.1f} ms{suffix}")
+        status = "within" if self.report()["within_budget"] else "OVER"
+        print(f"startup: ready in {self.ready_ms:.1f} ms ({status} budget of {self.budget_ms:.0f} ms)")
+
+
+# Global instance
+startup_profile = StartupProfile(STARTUP_BUDGET_MS)
@@ -0,0 +1,184 @@
+"""
+Randomized checks of the graph algorithms against brute force on small
+graphs: Tarjan SCCs, closure rows (also under eviction), the bitset batch
+reach pass, lazy-greedy worst-case search, dominators and articulation
+points
+"""
+
+import itertools
+import random
+from collections import deque
+
+import pytest
+
+import graph_engine
+import simulator
+from graph_analysis import articulation_points, immediate_dominators
+from graph_engine import AgentGraph
+from simulator import batch_reach_sizes, worst_case_failure_set
+
+
+def _random_graph(rng: random.Random, n: int, m: int) -> AgentGraph:
+    agents = [{"id": f"a{i}", "name": f"A{i}", "type": "t", "risk": "low"} for i in range(n)]
+    dependencies = [
+        {"source": f"a{rng.randrange(n)}", "target": f"a{rng.randrange(n)}", "type": "api_call", "confidence": 0.9}
+        for _ in range(m)
+    ]
+    return AgentGraph(agents, dependencies)
+
+
+def _graphs(seed: int, count: int = 40, max_nodes: int = 30):
+    rng = random.Random(seed)
+    for _ in range(count):
+        n = rng.randint(1, max_nodes)
+        yield rng, _random_graph(rng, n, rng.randint(0, 3 * n))
+
+
+def _reach(successors, start: int, removed: int = -1) -> set:
+    """Nodes reachable from start by plain BFS (start included), skipping `removed`"""
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        v = queue.popleft()
+        for w in successors[v]:
+            if w != removed and w not in seen:
+                seen.add(w)
+                queue.append(w)
+    return seen
+
+
+def _bits(nodes) -> int:
+    return sum(1 << v for v in nodes)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_components_match_mutual_reachability(seed):
+    for _, graph in _graphs(seed):
+        comp_of = graph.components[0]
+        reach = [_reach(graph.successors, v) for v in range(graph.node_count)]
+        for u in range(graph.node_count):
+            for v in range(graph.node_count):
+                assert (comp_of[u] == comp_of[v]) == (v in reach[u] and u in reach[v])
+            # Reverse topological numbering: callees never above callers
+            for w in graph.successors[u]:
+                assert comp_of[u] >= comp_of[w]
+
+
+def test_components_of_deep_graphs():
+    # Far deeper than the recursion limit: one long chain, then one long cycle
+    n = 20000
+    chain = AgentGraph(
+        [{"id": f"a{i}", "name": "", "type": "t", "risk": "low"} for i in range(n)],
+        [{"source": f"a{i}", "target": f"a{i + 1}", "type": "api_call", "confidence": 1} for i in range(n - 1)]
+    )
+    assert len(chain.components[1]) == n
+    cycle = AgentGraph(
+        chain.agents,
+        chain.dependencies + [{"source": f"a{n - 1}", "target": "a0", "type": "api_call", "confidence": 1}]
+    )
+    assert len(cycle.components[1]) == 1
+
+
+@pytest.mark.parametrize("closure_cache_mb", [64, 0.00001])
+@pytest.mark.parametrize("seed", range(3))
+def test_closure_rows_match_bfs(seed, closure_cache_mb, monkeypatch):
+    # A tiny budget keeps rows lazy and evicts them while others are built
+    monkeypatch.setattr(graph_engine, "CLOSURE_CACHE_MB", closure_cache_mb)
+    for rng, graph in _graphs(seed, max_nodes=60):
+        order = list(range(graph.node_count)) * 2
+        rng.shuffle(order)
+        for v in order:
+            reach = _reach(graph.successors, v)
+            assert graph.closure.reach_of(graph.components[0][v]) == _bits(reach)
+            assert graph.closure.reach_bits(v) == _bits(reach - {v})
+
+
+@pytest.mark.parametrize("block_bytes", [None, 8])
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_reach_sizes_match_bfs(seed, block_bytes, monkeypatch):
+    if block_bytes is not None:
+        # One 64-node word per block: exercises the column blocking
+        monkeypatch.setattr(simulator, "BITSET_BLOCK_BYTES", block_bytes)
+    for rng, graph in _graphs(seed, max_nodes=150):
+        n = graph.node_count
+        nodes = [rng.randrange(n) for _ in range(rng.randint(1, 10))]
+        excluded = {v for v in range(n) if rng.random() < 0.3}
+        sizes = batch_reach_sizes(graph, nodes, exclude=_bits(excluded)).tolist()
+        assert sizes == [len(_reach(graph.successors, v) - excluded) for v in nodes]
+
+
+@pytest.mark.parametrize("rescore_limit", [1, 1000])
+@pytest.mark.parametrize("seed", range(3))
+def test_worst_case_failure_set_is_greedy(seed, rescore_limit, monkeypatch):
+    monkeypatch.setattr(simulator, "WORST_CASE_RESCORE_LIMIT", rescore_limit)
+    for rng, graph in _graphs(seed, max_nodes=12):
+        reach = {a["id"]: _reach(graph.successors, graph.index[a["id"]]) for a in graph.agents}
+        k = rng.randint(1, 3)
+        picks = worst_case_failure_set(graph, k)
+
+        # Every pick has the best marginal gain available at that point
+        covered = set()
+        for pick in picks:
+            best = max(len(r - covered) for r in reach.values())
+            assert pick["marginal_gain"] == len(reach[pick["agent_id"]] - covered) == best > 0
+            covered |= reach[pick["agent_id"]]
+            assert pick["total_down"] == len(covered)
+        assert len(picks) == k or all(not (r - covered) for r in reach.values())
+
+        # ...and so stays within (1 - 1/e) of the best k-set
+        optimum = max(
+            len(set().union(*(reach[a] for a in chosen)))
+            for chosen in itertools.combinations(reach, min(k, len(reach)))
+        )
+        assert len(covered) >= (1 - 1 / 2.718281828) * optimum
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_dominators_match_node_removal(seed):
+    for _, graph in _graphs(seed):
+        n = graph.node_count
+        comp_of = graph.components[0]
+        has_incoming = {comp_of[t] for s, t in zip(graph.edge_sources, graph.edge_targets) if comp_of[s] != comp_of[t]}
+        entries = [v for v in range(n) if comp_of[v] not in has_incoming]
+
+        idom = immediate_dominators(graph)
+        for v in range(n):
+            dominators = set()
+            d = idom[v]
+            while d != -1:
+                dominators.add(d)
+                d = idom[d]
+            # d dominates v if v is unreachable from every entry once d is gone
+            expected = set()
+            for d in range(n):
+                if d == v:
+                    continue
+                reachable = set()
+                for entry in entries:
+                    if entry != d:
+                        reachable |= _reach(graph.successors, entry, removed=d)
+                if v not in reachable:
+                    expected.add(d)
+            assert dominators == expected
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_articulation_points_match_node_removal(seed):
+    def component_count(neighbours, removed: int = -1) -> int:
+        seen = {removed}
+        count = 0
+        for v in range(len(neighbours)):
+            if v not in seen:
+                count += 1
+                seen |= _reach(neighbours, v, removed)
+        return count
+
+    for _, graph in _graphs(seed):
+        neighbours = [set() for _ in range(graph.node_count)]
+        for s, t in zip(graph.edge_sources, graph.edge_targets):
+            neighbours[s].add(t)
+            neighbours[t].add(s)
+        base = component_count(neighbours)
+        is_cut = articulation_points(graph)
+        for v in range(graph.node_count):
+            assert is_cut[v] == (component_count(neighbours, v) > base)
@@ -0,0 +1,116 @@
+"""
+Randomized check of AgentGraph.with_changes against a full rebuild:
+adjacency, edge positions, SCC partition and closure rows must match
+whatever indexes were carried over (_carry_indexes)
+"""
+
+import random
+
+import pytest
+
+import graph_engine
+from graph_engine import AgentGraph
+
+
+def _random_graph(rng: random.Random, n: int, m: int):
+    agents = [{"id": f"a{i}", "name": f"A{i}", "type": "t", "risk": "low"} for i in range(n)]
+    dependencies = [
+        {
+            "source": f"a{rng.randrange(n)}",
+            "target": f"a{rng.randrange(n)}",
+            "type": rng.choice(["api_call", "event"]),
+            "confidence": 0.9
+        }
+        for _ in range(m)
+    ]
+    return agents, dependencies
+
+
+def _partition(comp_of):
+    groups = {}
+    for node, comp in enumerate(comp_of):
+        groups.setdefault(comp, []).append(node)
+    return sorted(sorted(members) for members in groups.values())
+
+
+def _assert_matches_rebuild(graph: AgentGraph) -> None:
+    ref = AgentGraph(graph.agents, graph.dependencies, graph.ids)
+    assert ref.ids == graph.ids
+    for v in range(graph.node_count):
+        assert sorted(graph.successors[v]) == sorted(ref.successors[v])
+        assert sorted(graph.predecessors[v]) == sorted(ref.predecessors[v])
+        for e in graph.out_edges[v]:
+            assert graph.edge_sources[e] == v
+            assert graph.index[graph.dependencies[e]["source"]] == v
+        for e in graph.in_edges[v]:
+            assert graph.edge_targets[e] == v
+            assert graph.index[graph.dependencies[e]["target"]] == v
+
+    if graph._components is not None:
+        comp_of = graph.components[0]
+        # Tarjan numbering: callees never get a higher component than callers
+        for v in range(graph.node_count):
+            for w in graph.successors[v]:
+                assert comp_of[v] >= comp_of[w]
+        assert _partition(comp_of) == _partition(ref.components[0])
+
+    if graph._closure is not None:
+        for v in range(graph.node_count):
+            assert graph.closure.reach_bits(v) == ref.closure.reach_bits(v)
+
+
+def _random_changes(rng: random.Random, graph: AgentGraph, tag: str):
+    agent_ids = [a["id"] for a in graph.agents]
+    upsert_agents = [
+        {"id": rng.choice(agent_ids + [f"{tag}_{k}" for k in range(2)]), "name": "x", "type": "t", "risk": "high"}
+        for _ in range(rng.randint(0, 2))
+    ]
+    remove_agents = rng.sample(agent_ids, min(len(agent_ids), rng.randint(0, 1)))
+    upsert_dependencies = [
+        {
+            "source": rng.choice(graph.ids + ["unscanned"]),
+            "target": rng.choice(graph.ids),
+            "type": rng.choice(["api_call", "event"]),
+            "confidence": 0.5
+        }
+        for _ in range(rng.randint(0, 4))
+    ]
+    # Removals match on (source, target), and on type only when given
+    remove_dependencies = [
+        {"source": d["source"], "target": d["target"], **({"type": d["type"]} if rng.random() < 0.5 else {})}
+        for d in rng.sample(graph.dependencies, min(len(graph.dependencies), rng.randint(0, 3)))
+    ]
+    return upsert_agents, remove_agents, upsert_dependencies, remove_dependencies
+
+
+@pytest.mark.parametrize("closure_cache_mb", [64, 0.0001])
+@pytest.mark.parametrize("seed", range(6))
+def test_with_changes_matches_full_rebuild(seed, closure_cache_mb, monkeypatch):
+    # A tiny budget keeps the closure partial, so carried rows get evicted
+    monkeypatch.setattr(graph_engine, "CLOSURE_CACHE_MB", closure_cache_mb)
+    rng = random.Random(seed)
+    for trial in range(50):
+        n = rng.randint(2, 40)
+        graph = AgentGraph(*_random_graph(rng, n, rng.randint(0, 3 * n)))
+        mode = rng.random()
+        if mode < 0.8:
+            graph.closure.reach_bits(0)
+        elif mode < 0.9:
+            graph.components
+
+        for step in range(5):
+            changes = _random_changes(rng, graph, f"new{trial}_{step}")
+            graph, stats = graph.with_changes(*changes)
+            assert stats["elapsed_ms"] >= 0
+            _assert_matches_rebuild(graph)
+
+
+def test_metadata_only_change_keeps_indexes():
+    rng = random.Random(0)
+    graph = AgentGraph(*_random_graph(rng, 30, 60))
+    rows = graph.closure.rows()
+    updated, _ = graph.with_changes(upsert_agents=[{"id": "a3", "name": "renamed", "type": "t", "risk": "high"}])
+    assert updated.get_agent("a3")["name"] == "renamed"
+    assert updated.topology_hash == graph.topology_hash
+    assert updated.components[0] == graph.components[0]
+    assert updated.closure.rows() == rows
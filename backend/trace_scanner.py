@@ -0,0 +1,430 @@
+"""
+Trace Scanner for AgentGuard
+Derives agents and dependencies from OpenTelemetry traces on disk:
+- Streams OTLP/JSON files (one ExportTraceServiceRequest per line, as the
+  collector's file exporter writes them; .gz accepted), never the whole file
+- Services become agents; parent -> child spans across services become edges
+- Per-edge call counts, errors, latency and a confidence that grows with calls
+- Bounded memory: parent lookups use a two-generation span window, latency a
+  fixed log2 histogram per edge
+- Client spans to a peer.service that never reports spans become shadow agents
+"""
+
+import os
+import gzip
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+AGENTGUARD_TRACE_DIR = os.getenv("AGENTGUARD_TRACE_DIR", "traces")
+TRACE_SPAN_WINDOW = int(os.getenv("TRACE_SPAN_WINDOW", "1000000"))
+# Largest pretty-printed (single request, not line-delimited) file parsed whole
+TRACE_DOCUMENT_MAX_BYTES = int(os.getenv("TRACE_DOCUMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Calls at which an edge's confidence is halfway between the floor and the cap
+CONFIDENCE_PRIOR_CALLS = 20
+CONFIDENCE_FLOOR = 0.5
+CONFIDENCE_CAP = 0.99
+
+# Latency histogram: bucket b holds durations below 2**b microseconds
+LATENCY_BUCKETS = 40
+
+# OTLP span kinds and status codes (JSON encodes the enum as an integer)
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_PRODUCER = 4
+SPAN_KIND_CONSUMER = 5
+STATUS_CODE_ERROR = 2
+
+# Resource attributes that override the derived agent fields
+AGENT_TYPE_ATTRIBUTE = "agentguard.agent.type"
+AGENT_RISK_ATTRIBUTE = "agentguard.agent.risk"
+AGENT_OWNER_ATTRIBUTE = "agentguard.agent.owner"
+
+# Fan-in (distinct callers) at which a derived risk level starts
+RISK_BY_FAN_IN = (("critical", 5), ("high", 3), ("medium", 1))
+
+
+class TraceScanError(Exception):
+    """No usable traces (as opposed to a bad line, which is counted and skipped)"""
+
+
+class _EdgeStats:
+    """Aggregated calls along one service -> service edge"""
+
+    __slots__ = ("calls", "errors", "events", "latency_us", "histogram", "sample_trace_id", "last_seen_ns")
+
+    def __init__(self, trace_id: str):
+        self.calls = 0
+        self.errors = 0
+        self.events = 0
+        self.latency_us = 0
+        self.histogram = [0] * LATENCY_BUCKETS
+        self.sample_trace_id = trace_id
+        self.last_seen_ns = 0
+
+    def add(self, duration_us: int, error: bool, event: bool, end_ns: int) -> None:
+        self.calls += 1
+        self.errors += error
+        self.events += event
+        self.latency_us += duration_us
+        self.histogram[min(duration_us.bit_length(), LATENCY_BUCKETS - 1)] += 1
+        if end_ns > self.last_seen_ns:
+            self.last_seen_ns = end_ns
+
+    def percentile_ms(self, pct: float) -> float:
+        """Upper bound of the histogram bucket holding the pct-th call"""
+        rank = self.calls * pct / 100
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank and count:
+                return round((1 << bucket) / 1000, 1)
+        return 0.0
+
+
+class _ServiceStats:
+    """Spans reported by one service"""
+
+    __slots__ = ("entry_spans", "errors", "latency_us", "first_ns", "last_ns", "attributes")
+
+    def __init__(self):
+        self.entry_spans = 0
+        self.errors = 0
+        self.latency_us = 0
+        self.first_ns = 0
+        self.last_ns = 0
+        self.attributes: Dict[str, Any] = {}
+
+
+class TraceScanner:
+    """One pass over a set of OTLP/JSON trace files"""
+
+    def __init__(self, span_window: int = TRACE_SPAN_WINDOW):
+        self.span_window = span_window
+        self.services: Dict[str, _ServiceStats] = {}
+        self.edges: Dict[Tuple[str, str], _EdgeStats] = {}
+        self.peer_edges: Dict[Tuple[str, str], _EdgeStats] = {}
+        # span key -> (service, kind); two generations, the older dropped
+        # wholesale once the newer fills half the window
+        self._spans: Dict[str, Tuple[str, int]] = {}
+        self._old_spans: Dict[str, Tuple[str, int]] = {}
+        # parent span key -> children seen before their parent
+        self._pending: Dict[str, List[tuple]] = {}
+        self._old_pending: Dict[str, List[tuple]] = {}
+        self.files = 0
+        self.bytes_read = 0
+        self.spans = 0
+        self.invalid_lines = 0
+        self.invalid_spans = 0
+        self.orphaned_spans = 0
+        self.elapsed_ms = 0.0
+
+    def scan(self, paths: Iterable[Path]) -> None:
+        started = time.perf_counter()
+        for path in paths:
+            self.files += 1
+            for request in self._requests(path):
+                self._resource_spans(request.get("resourceSpans") or [])
+        self.orphaned_spans += sum(len(c) for c in self._pending.values())
+        self.orphaned_spans += sum(len(c) for c in self._old_pending.values())
+        self._pending, self._old_pending = {}, {}
+        self._spans, self._old_spans = {}, {}
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+
+    def _requests(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """
+        Decoded export requests of one file, one line at a time. A file
+        whose first line is a bare "{" is taken as one pretty-printed
+        request and parsed whole, up to TRACE_DOCUMENT_MAX_BYTES; past that,
+        or if it does not parse, it is read line by line like any other.
+        bytes_read counts decompressed bytes for .gz files too.
+        """
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as f:
+            first = True
+            for raw in f:
+                self.bytes_read += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                if first:
+                    first = False
+                    if line == b"{":
+                        line_end = f.tell()
+                        request = self._document(f, raw)
+                        if request is not None:
+                            yield request
+                            return
+                        self.invalid_lines += 1
+                        f.seek(line_end)
+                        continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self.invalid_lines += 1
+                    continue
+                if isinstance(request, dict):
+                    yield request
+                else:
+                    self.invalid_lines += 1
+
+    def _document(self, f, head: bytes) -> Optional[Dict[str, Any]]:
+        """Rest of a pretty-printed file as one request, or None if too large or invalid"""
+        rest = f.read(TRACE_DOCUMENT_MAX_BYTES - len(head) + 1)
+        if len(head) + len(rest) > TRACE_DOCUMENT_MAX_BYTES:
+            return None
+        try:
+            request = json.loads(head + rest)
+        except ValueError:
+            return None
+        if not isinstance(request, dict):
+            return None
+        self.bytes_read += len(rest)
+        return request
+
+    def _resource_spans(self, resource_spans: List[Dict[str, Any]]) -> None:
+        # Register the whole batch first so parents later in it still resolve
+        spans = self._spans
+        batch = []
+        for resource_span in resource_spans:
+            attributes = _attributes((resource_span.get("resource") or {}).get("attributes"))
+            service_name = attributes.get("service.name") or "unknown_service"
+            service = self.services.get(service_name)
+            if service is None:
+                service = self.services[service_name] = _ServiceStats()
+                service.attributes = attributes
+            for scope_span in resource_span.get("scopeSpans") or resource_span.get("instrumentationLibrarySpans") or []:
+                for span in scope_span.get("spans") or []:
+                    try:
+                        start_ns = int(span.get("startTimeUnixNano") or 0)
+                        end_ns = int(span.get("endTimeUnixNano") or 0)
+                    except (TypeError, ValueError):
+                        self.invalid_spans += 1
+                        continue
+                    trace_id = span.get("traceId", "")
+                    key = trace_id + span.get("spanId", "")
+                    kind = span.get("kind", 0)
+                    spans[key] = (service_name, kind)
+                    batch.append((service_name, service, span, trace_id, key, kind, start_ns, end_ns))
+
+        for service_name, service, span, trace_id, key, kind, start_ns, end_ns in batch:
+            self._span(service_name, service, span, trace_id, kind, start_ns, end_ns)
+            if self._pending or self._old_pending:
+                for pending in (self._pending, self._old_pending):
+                    for child in pending.pop(key, ()):
+                        self._link(service_name, kind, *child)
+
+        self.spans += len(batch)
+        if len(spans) >= self.span_window // 2:
+            self.orphaned_spans += sum(len(c) for c in self._old_pending.values())
+            self._old_spans, self._spans = spans, {}
+            self._old_pending, self._pending = self._pending, {}
+
+    def _span(
+        self,
+        service_name: str,
+        service: _ServiceStats,
+        span: Dict[str, Any],
+        trace_id: str,
+        kind: int,
+        start_ns: int,
+        end_ns: int
+    ) -> None:
+        duration_us = max(end_ns - start_ns, 0) // 1000
+        status = span.get("status")
+        error = status is not None and status.get("code") == STATUS_CODE_ERROR
+        parent_id = span.get("parentSpanId")
+
+        if start_ns < service.first_ns or not service.first_ns:
+            service.first_ns = start_ns
+        if end_ns > service.last_ns:
+            service.last_ns = end_ns
+        if kind == SPAN_KIND_SERVER or kind == SPAN_KIND_CONSUMER or not parent_id:
+            service.entry_spans += 1
+            service.errors += error
+            service.latency_us += duration_us
+        elif kind == SPAN_KIND_CLIENT or kind == SPAN_KIND_PRODUCER:
+            peer = _peer_service(span.get("attributes"))
+            if peer and peer != service_name:
+                edge = self.peer_edges.get((service_name, peer))
+                if edge is None:
+                    edge = self.peer_edges[(service_name, peer)] = _EdgeStats(trace_id)
+                edge.add(duration_us, error, kind == SPAN_KIND_PRODUCER, end_ns)
+
+        if not parent_id:
+            return
+        child = (service_name, kind, duration_us, error, end_ns, trace_id)
+        parent_key = trace_id + parent_id
+        parent = self._spans.get(parent_key) or self._old_spans.get(parent_key)
+        if parent is None:
+            self._pending.setdefault(parent_key, []).append(child)
+        else:
+            self._link(parent[0], parent[1], *child)
+
+    def _link(
+        self,
+        parent_service: str,
+        parent_kind: int,
+        service_name: str,
+        kind: int,
+        duration_us: int,
+        error: bool,
+        end_ns: int,
+        trace_id: str
+    ) -> None:
+        """Count a child span against the edge from its parent's service"""
+        if parent_service == service_name:
+            return
+        edge = self.edges.get((parent_service, service_name))
+        if edge is None:
+            edge = self.edges[(parent_service, service_name)] = _EdgeStats(trace_id)
+        event = parent_kind == SPAN_KIND_PRODUCER or kind == SPAN_KIND_CONSUMER
+        edge.add(duration_us, error, event, end_ns)
+
+    def result(self) -> Dict[str, Any]:
+        """Agents and dependencies in the shape the demo datasets use"""
+        if not self.services:
+            raise TraceScanError("No spans found in the trace files")
+
+        edges = dict(self.edges)
+        shadow: Dict[str, List[_EdgeStats]] = {}
+        for (source, peer), edge in self.peer_edges.items():
+            # Instrumented peers already have real edges; the rest never reported
+            if peer not in self.services:
+                edges[(source, peer)] = edge
+                shadow.setdefault(peer, []).append(edge)
+
+        callers: Dict[str, set] = {}
+        for source, target in edges:
+            callers.setdefault(target, set()).add(source)
+
+        agents = [_agent(name, stats, len(callers.get(name, ()))) for name, stats in self.services.items()]
+        agents += [_shadow_agent(name, incoming) for name, incoming in shadow.items()]
+        dependencies = [_dependency(source, target, edge) for (source, target), edge in edges.items()]
+        return {"agents": agents, "dependencies": dependencies}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "bytes_read": self.bytes_read,
+            "spans": self.spans,
+            "services": len(self.services),
+            "edges": len(self.edges),
+            "invalid_lines": self.invalid_lines,
+            "invalid_spans": self.invalid_spans,
+            "orphaned_spans": self.orphaned_spans,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "spans_per_sec": round(self.spans / (self.elapsed_ms / 1000)) if self.elapsed_ms else None
+        }
+
+
+def _attributes(attributes: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """OTLP key/value list -> plain dict of scalar values"""
+    values = {}
+    for attribute in attributes or []:
+        value = attribute.get("value") or {}
+        for scalar in ("stringValue", "intValue", "doubleValue", "boolValue"):
+            if scalar in value:
+                values[attribute.get("key")] = value[scalar]
+                break
+    return values
+
+
+def _peer_service(attributes: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """peer.service of a client/producer span, without decoding its other attributes"""
+    for attribute in attributes or ():
+        if attribute.get("key") == "peer.service":
+            return (attribute.get("value") or {}).get("stringValue")
+    return None
+
+
+def _agent(name: str, stats: _ServiceStats, fan_in: int) -> Dict[str, Any]:
+    """Agent record for an instrumented service, from its entry spans"""
+    attributes = stats.attributes
+    risk = attributes.get(AGENT_RISK_ATTRIBUTE) or _risk(fan_in)
+    agent_type = attributes.get(AGENT_TYPE_ATTRIBUTE) or ("core_service" if fan_in else "user_facing")
+    record = _agent_record(
+        name, agent_type, risk, stats.entry_spans, stats.errors, stats.latency_us,
+        stats.last_ns - stats.first_ns, stats.last_ns
+    )
+    record["version"] = str(attributes.get("service.version", "unknown"))
+    record["owner"] = attributes.get(AGENT_OWNER_ATTRIBUTE, "unknown")
+    return record
+
+
+def _shadow_agent(name: str, incoming: List[_EdgeStats]) -> Dict[str, Any]:
+    """Agent record for a peer only seen from its callers' client spans"""
+    return _agent_record(
+        name, "shadow_agent", _risk(len(incoming)),
+        sum(e.calls for e in incoming), sum(e.errors for e in incoming), sum(e.latency_us for e in incoming),
+        0, max(e.last_seen_ns for e in incoming)
+    )
+
+
+def _agent_record(
+    name: str,
+    agent_type: str,
+    risk: str,
+    calls: int,
+    errors: int,
+    latency_us: int,
+    window_ns: int,
+    last_ns: int
+) -> Dict[str, Any]:
+    minutes = window_ns / 60e9
+    return {
+        "id": name,
+        "name": name,
+        "type": agent_type,
+        "risk": risk,
+        "version": "unknown",
+        "uptime": f"{100 * (1 - errors / calls) if calls else 100:.1f}%",
+        "requests_per_min": round(calls / minutes) if minutes >= 1 else calls,
+        "avg_latency_ms": round(latency_us / calls / 1000) if calls else 0,
+        "last_seen": _timestamp(last_ns),
+        "owner": "unknown"
+    }
+
+
+def _risk(fan_in: int) -> str:
+    return next((level for level, threshold in RISK_BY_FAN_IN if fan_in >= threshold), "low")
+
+
+def _dependency(source: str, target: str, edge: _EdgeStats) -> Dict[str, Any]:
+    support = edge.calls / (edge.calls + CONFIDENCE_PRIOR_CALLS)
+    return {
+        "source": source,
+        "target": target,
+        "type": "event" if edge.events * 2 > edge.calls else "api_call",
+        "confidence": round(CONFIDENCE_FLOOR + (CONFIDENCE_CAP - CONFIDENCE_FLOOR) * support, 2),
+        "call_count": edge.calls,
+        "error_rate": round(edge.errors / edge.calls, 4),
+        "avg_latency_ms": round(edge.latency_us / edge.calls / 1000, 1),
+        "p95_latency_ms": edge.percentile_ms(95),
+        "sample_trace_id": edge.sample_trace_id,
+        "last_seen": _timestamp(edge.last_seen_ns)
+    }
+
+
+def _timestamp(unix_ns: int) -> Optional[str]:
+    if not unix_ns:
+        return None
+    return datetime.fromtimestamp(unix_ns / 1e9, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def trace_files(pattern: str, trace_dir: str = AGENTGUARD_TRACE_DIR) -> List[Path]:
+    """Files under the trace directory matching a relative glob, in name order"""
+    if Path(pattern).is_absolute() or ".." in Path(pattern).parts:
+        raise TraceScanError("Trace file pattern must be relative to the trace directory")
+    root = Path(trace_dir)
+    return sorted(p for p in root.glob(pattern) if p.is_file())
+
+
+def scan_traces(paths: Iterable[Path]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Dataset (agents, dependencies) and scan stats for a set of trace files"""
+    scanner = TraceScanner()
+    scanner.scan(paths)
+    return scanner.result(), scanner.stats()
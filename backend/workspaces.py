@@ -0,0 +1,312 @@
+"""
+Workspace Store for AgentGuard
+Per-session state in place of one process-wide dict:
+- One workspace per X-Workspace-Id header ("default" when absent)
+- Each holds the scan, graph, simulation and playbook of one team
+- LRU eviction by workspace count and by estimated total memory
+- With a shared state store, every worker process sees the same workspaces
+"""
+
+import os
+import re
+import json
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from graph_engine import AgentGraph
+from ingest import NDJSONIngest
+from playbook_prewarm import PlaybookPrewarmer, PLAYBOOK_PREWARM_TOP_N, PLAYBOOK_PREWARM_WORKERS
+from shared_store import SharedStateStore, JSON_FIELDS, shared_store
+
+WORKSPACE_HEADER = "X-Workspace-Id"
+DEFAULT_WORKSPACE = "default"
+WORKSPACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+WORKSPACE_MAX_COUNT = int(os.getenv("WORKSPACE_MAX_COUNT", "64"))
+WORKSPACE_MEMORY_MB = float(os.getenv("WORKSPACE_MEMORY_MB", "512"))
+
+# Deserialized graphs kept per process, shared by workspaces on the same scan
+GRAPH_CACHE_SIZE = 8
+
+
+def encode_response(value: Any) -> Tuple[str, bytes]:
+    """(ETag, JSON body) of a response value; the ETag hashes the body"""
+    body = json.dumps(value).encode()
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body
+
+
+def _json_bytes(value: Any) -> int:
+    """Approximate size of a JSON-like response dict (2x its str length)"""
+    if value is None:
+        return 0
+    return 2 * len(str(value))
+
+
+class Workspace:
+    """State of one session; `state` has the keys the old global app_state had"""
+
+    def __init__(self, workspace_id: str):
+        self.id = workspace_id
+        self.state: Dict[str, Any] = {
+            "agents": [],
+            "dependencies": [],
+            "graph": None,
+            "scan_result": None,
+            "graph_data": None,
+            "simulation_result": None,
+            "playbook": None
+        }
+        self.prewarmer = PlaybookPrewarmer(PLAYBOOK_PREWARM_TOP_N, PLAYBOOK_PREWARM_WORKERS)
+        self.ingest: Optional[NDJSONIngest] = None
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.size_bytes = 0
+        # Shared store revision this process last read or wrote, and the
+        # identity of each persisted field at that point
+        self.revision: Optional[int] = None
+        self._seen: Dict[str, int] = {}
+        # state key -> (value, etag, body) of the last response encoded from it
+        self._encoded: Dict[str, Tuple[Any, str, bytes]] = {}
+
+    def mark_clean(self) -> None:
+        self._seen = {k: id(self.state[k]) for k in ("graph", *JSON_FIELDS)}
+
+    def changed(self, key: str) -> bool:
+        return self._seen.get(key) != id(self.state[key])
+
+    def encoded(self, key: str) -> Tuple[str, bytes]:
+        """
+        (ETag, JSON body) of state[key]; the ETag hashes the body, so any
+        change to the response (scan time included) gets a new one. Only
+        re-encoded once the value has been replaced.
+        """
+        value = self.state[key]
+        cached = self._encoded.get(key)
+        if cached is None or cached[0] is not value:
+            cached = self._encoded[key] = (value, *encode_response(value))
+        return cached[1], cached[2]
+
+    def store_encoded(self, key: str, value: Any, encoded: Tuple[str, bytes]) -> None:
+        """Set state[key] together with its (ETag, body) from encode_response"""
+        self.state[key] = value
+        self._encoded[key] = (value, *encoded)
+
+    def measure(self) -> int:
+        """Re-estimate the memory held by this workspace"""
+        graph = self.state["graph"]
+        size = graph.memory_estimate() if graph is not None else 0
+        # scan_result and graph_data mostly share records with the graph
+        size += _json_bytes(self.state["simulation_result"]) + _json_bytes(self.state["playbook"])
+        size += sum(len(body) for _, _, body in self._encoded.values())
+        self.size_bytes = size
+        return size
+
+    def close(self) -> None:
+        """Stop background work before the workspace is dropped"""
+        self.prewarmer.cancel()
+
+
+class WorkspaceStore:
+    """LRU of workspaces, bounded by count and by total estimated bytes"""
+
+    def __init__(self, max_count: int, memory_bytes: int, shared: SharedStateStore):
+        self.max_count = max_count
+        self.memory_bytes = memory_bytes
+        self.shared = shared
+        self._workspaces: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._graphs: "OrderedDict[str, AgentGraph]" = OrderedDict()
+        # Index names already in the shared store, per graph version held here
+        self._persisted: Dict[str, Set[str]] = {}
+        # Serializes shared-store writes so a graph row always lands before
+        # the workspace rows that point at it
+        self._write_lock = asyncio.Lock()
+        self.evictions = 0
+
+    async def get(self, workspace_id: Optional[str]) -> Workspace:
+        """Workspace for an id, created on first use and marked most recent"""
+        workspace_id = workspace_id or DEFAULT_WORKSPACE
+        if not WORKSPACE_ID_PATTERN.match(workspace_id):
+            raise ValueError(f"Invalid workspace id: {workspace_id!r}")
+        workspace = self._workspaces.get(workspace_id)
+        if workspace is None:
+            workspace = Workspace(workspace_id)
+            self._workspaces[workspace_id] = workspace
+        else:
+            self._workspaces.move_to_end(workspace_id)
+        workspace.last_used = time.time()
+        if self.shared.enabled:
+            await self._sync(workspace)
+        workspace.mark_clean()
+        return workspace
+
+    async def _sync(self, workspace: Workspace) -> None:
+        """
+        Reload a workspace another worker has written since we last saw it;
+        the revision check and decoding run in a worker thread
+        """
+        revision = await asyncio.to_thread(self.shared.revision, workspace.id)
+        if revision is None or revision == workspace.revision:
+            return
+        loaded, graph = await asyncio.to_thread(self._read, workspace.id)
+        state = workspace.state
+        if graph is not state["graph"]:
+            state["graph"] = graph
+            state["agents"] = graph.agents if graph else []
+            state["dependencies"] = graph.dependencies if graph else []
+            state["graph_data"] = None
+        for name in JSON_FIELDS:
+            state[name] = loaded[name]
+        workspace.revision = loaded["revision"]
+
+    def _read(self, workspace_id: str) -> Tuple[Dict[str, Any], Optional[AgentGraph]]:
+        loaded = self.shared.load_workspace(workspace_id)
+        graph = self._load_graph(loaded["scan_version"]) if loaded["scan_version"] else None
+        return loaded, graph
+
+    async def load_snapshot(self, snapshot_id: str) -> Optional[AgentGraph]:
+        """AgentGraph of a stored snapshot, deserialized once per process"""
+        if not self.shared.enabled:
+            return None
+        return await asyncio.to_thread(self._load_graph, snapshot_id)
+
+    async def preload_latest_snapshot(self) -> Optional[str]:
+        """
+        Deserialize the newest snapshot in a worker thread, ahead of the
+        first request that needs it
+        """
+        if not self.shared.enabled:
+            return None
+        latest = await asyncio.to_thread(self.shared.list_snapshots, 1)
+        if not latest:
+            return None
+        version = latest[0]["snapshot_id"]
+        if version not in self._graphs:
+            await asyncio.to_thread(self._load_graph, version)
+        return version
+
+    def _load_graph(self, version: str) -> Optional[AgentGraph]:
+        graph = self._graphs.get(version)
+        if graph is None:
+            stored = self.shared.load_graph(version)
+            if stored is None:
+                return None
+            data, indexes = stored
+            graph = AgentGraph.from_bytes(data, indexes)
+            self._persisted[version] = set(graph.built_indexes())
+            self._remember_graph(graph)
+        else:
+            self._graphs.move_to_end(version)
+        return graph
+
+    def _remember_graph(self, graph: AgentGraph) -> None:
+        self._graphs[graph.content_hash] = graph
+        while len(self._graphs) > GRAPH_CACHE_SIZE:
+            version, _ = self._graphs.popitem(last=False)
+            self._persisted.pop(version, None)
+
+    async def commit(self, workspace: Workspace) -> None:
+        """
+        Write the fields this request changed to the shared store, plus the
+        graph the first time its version is stored and any derived index
+        built since. Encoding and SQLite writes run in a worker thread.
+        """
+        if not self.shared.enabled:
+            return
+        state = workspace.state
+        graph = state["graph"]
+        changes: Dict[str, Any] = {}
+        if workspace.changed("graph"):
+            changes["scan_version"] = graph.content_hash if graph is not None else None
+        for name in JSON_FIELDS:
+            if workspace.changed(name):
+                changes[name] = state[name]
+        workspace.mark_clean()
+
+        if not changes:
+            saved = self._persisted.get(graph.content_hash) if graph is not None else None
+            if graph is None or (saved is not None and saved.issuperset(graph.built_indexes())):
+                return
+        demo_type = (state["scan_result"] or {}).get("demo_type")
+        async with self._write_lock:
+            revision = await asyncio.to_thread(self._persist, workspace.id, graph, demo_type, changes)
+        if revision is not None:
+            workspace.revision = revision
+
+    def _persist(
+        self,
+        workspace_id: str,
+        graph: Optional[AgentGraph],
+        demo_type: Optional[str],
+        changes: Dict[str, Any]
+    ) -> Optional[int]:
+        if graph is not None:
+            # A new scan version re-checks the store: another worker may
+            # have pruned a snapshot this process still remembers
+            self._save_graph(graph, demo_type, refresh="scan_version" in changes)
+        if not changes:
+            return None
+        revision = self.shared.save_workspace(workspace_id, changes)
+        if "scan_version" in changes:
+            self.shared.prune(self.max_count)
+        return revision
+
+    def _save_graph(self, graph: AgentGraph, demo_type: Optional[str], refresh: bool) -> None:
+        version = graph.content_hash
+        saved = None if refresh else self._persisted.get(version)
+        if saved is None:
+            stored = self.shared.graph_indexes(version)
+            if stored is None:
+                self.shared.save_graph(
+                    version, graph.to_bytes(), demo_type, graph.agent_count, len(graph.dependencies)
+                )
+                stored = []
+            saved = set(stored)
+        for name in graph.built_indexes():
+            if name not in saved:
+                self.shared.save_graph_index(version, name, graph.index_bytes(name))
+                saved.add(name)
+        self._persisted[version] = saved
+        if version not in self._graphs:
+            self._remember_graph(graph)
+
+    def enforce_limits(self, keep: Workspace) -> List[str]:
+        """
+        Re-measure `keep` and evict least recently used workspaces until
+        the store is within its count and memory limits. `keep` (the one
+        serving the current request) is never evicted.
+        """
+        keep.measure()
+        evicted = []
+        total = self.total_bytes()
+        while len(self._workspaces) > 1 and (
+            len(self._workspaces) > self.max_count or total > self.memory_bytes
+        ):
+            oldest_id = next(iter(self._workspaces))
+            if oldest_id == keep.id:
+                self._workspaces.move_to_end(oldest_id)
+                oldest_id = next(iter(self._workspaces))
+            oldest = self._workspaces.pop(oldest_id)
+            oldest.close()
+            total -= oldest.size_bytes
+            evicted.append(oldest_id)
+            self.evictions += 1
+        return evicted
+
+    def total_bytes(self) -> int:
+        return sum(w.size_bytes for w in self._workspaces.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": len(self._workspaces),
+            "max_count": self.max_count,
+            "memory_bytes": self.total_bytes(),
+            "memory_cap_bytes": self.memory_bytes,
+            "evictions": self.evictions,
+            "shared_store": self.shared.stats()
+        }
+
+
+# Global instance
+workspace_store = WorkspaceStore(WORKSPACE_MAX_COUNT, int(WORKSPACE_MEMORY_MB * 1024 * 1024), shared_store)